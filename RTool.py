@@ -1,8 +1,13 @@
 import streamlit as st
-import pandas as pd
-import altair as alt
-import io
-from info_content import variable_info_md
+from functools import partial
+from info_content import variable_info_md, get_schema_dict, get_variable_items
+from data_index import FilterIndex
+from catalog import DatasetCatalog, workbook_sources
+from charts import MAX_CHART_POINTS, OTHERS_LABEL
+from rendering import PanelView, make_view, views_footprint, warm_up_in_background
+from exports import EXPORT_FORMATS, export_bytes
+from diagnostics import SessionTracker, memory_report, profiling_enabled, RerunProfiler, checkpoint, profiled_run, run_profiled
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
 # -------------------------------------------------
 # Page setup
@@ -13,544 +18,522 @@ st.set_page_config(
     page_icon="📊"
 )
 
-st.title("📊 Civic Indicators – Domain-based Reporting Tool")
-st.markdown(
-    """
-    **Explore domain-based indicators over time.**
-    
-    Use the sidebar to filter data and customize the visualization.
-    """
-)
-
 # -------------------------------------------------
 # Load & reshape data
 # -------------------------------------------------
 import os
 
+# Number of (selection, style) views whose frames and chart specs are kept
+VIEW_CACHE_ENTRIES = 64
+
+# Number of generated export files kept
+EXPORT_CACHE_ENTRIES = 16
+
+# Panels shown per "page" of a grid (rounded down to whole rows)
+PANELS_PER_PAGE = 12
+
+# Rows per page of the raw data preview
+PREVIEW_ROWS = 200
+
 # -------------------------------------------------
 # Load & reshape data
 # -------------------------------------------------
-@st.cache_data
-def load_long_data(file_input, sheet: str = "Sheet1") -> pd.DataFrame:
+@st.cache_resource(max_entries=1)
+def load_catalog(sources) -> DatasetCatalog:
+    # Sheet schemas of all workbooks, shared by all reruns and sessions; a sheet's
+    # data is loaded (or read from its Parquet snapshot) the first time a domain needs it.
+    # One catalog is kept: when a workbook is added to or removed from the folder,
+    # the new set of sources replaces the old catalog and frees its tables
+    return DatasetCatalog(sources)
+
+def load_domain_index(sources, domain) -> FilterIndex:
     try:
-        raw = pd.read_excel(file_input, sheet_name=sheet)
-
-        # Assume first two columns are Domain and Question
-        col0, col1 = raw.columns[0], raw.columns[1]
-        raw = raw.rename(columns={col0: "Domain", col1: "Question"})
-
-        # First row holds year information for each country column
-        year_row = raw.iloc[0]
-
-        # Data rows start from row index 1
-        data = raw.iloc[1:].reset_index(drop=True)
+        return load_catalog(sources).domain_index(domain)
+    except Exception as e:
+        st.error(f"Error loading data: {e}")
+        st.stop()
+
+@st.cache_resource
+def session_tracker() -> SessionTracker:
+    # Sessions of this server process, for the per-session memory report;
+    # first called before any data is loaded, to record the baseline memory
+    return SessionTracker()
+
+@st.cache_resource(max_entries=VIEW_CACHE_ENTRIES)
+def build_view(sources, data_version, domain, questions, countries, year_range, chart_type, layout, graph_style, theme, focal_country, facet_columns) -> PanelView:
+    # Filtered frame plus the panels of the view, kept across reruns and
+    # sessions; least recently used views are evicted. data_version keys the
+    # cache to the catalog generation so reloaded data is never stale.
+    # Panel specs come from the on-disk chart cache or are built on worker
+    # threads the first time they are shown
+    return make_view(
+        load_catalog(sources).domain_index(domain), domain, questions, countries, year_range,
+        chart_type, layout, graph_style, theme, focal_country, facet_columns
+    )
 
-        # Columns containing numeric values (one per country–wave)
-        value_cols = [c for c in data.columns if c not in ["Domain", "Question"]]
+@st.cache_resource(max_entries=1)
+def start_chart_warm_up(sources, data_version):
+    # Renders the default view of the first domain, the one new sessions open, into
+    # the chart cache in the background, once per data generation (at startup and
+    # after every reload). Other domains are loaded when a session selects them
+    return warm_up_in_background(load_catalog(sources))
+
+@st.cache_resource(max_entries=EXPORT_CACHE_ENTRIES, show_spinner=False)
+def build_export(sources, data_version, fmt, domain, questions, countries, year_range) -> bytes:
+    # Export file for one selection, kept for repeated downloads. A resource
+    # cache hands every download the same (immutable) bytes object, where
+    # cache_data would pickle a copy into its store and unpickle one per hit
+    plot_df = load_catalog(sources).domain_index(domain).filter(domain, questions, countries, year_range)
+    return export_bytes(plot_df, fmt)
 
-        # Clean labels
-        data["Domain"] = data["Domain"].astype(str).str.strip()
-        data["Question"] = data["Question"].astype(str).str.strip()
+# -------------------------------------------------
+# Page
+# -------------------------------------------------
+def render_page():
+    # The page of one script run. A function, so that the run is profiled and
+    # logged however it ends: st.stop(), a rerun or an error cut it short
+    st.title("📊 Civic Indicators – Domain-based Reporting Tool")
+    st.markdown(
+        """
+        **Explore domain-based indicators over time.**
+    
+        Use the sidebar to filter data and customize the visualization.
+        """
+    )
 
-        # Long format
-        long_df = data.melt(
-            id_vars=["Domain", "Question"],
-            value_vars=value_cols,
-            var_name="col",
-            value_name="value"
-        )
+    # Check if default file exists (case-insensitive search)
+    default_filename = "Results.xlsx"
+    data_source = None
 
-        # Country from column name; Year from first row
-        long_df["Country"] = long_df["col"].astype(str).str.split(".").str[0]
-        long_df["Year"] = long_df["col"].apply(lambda c: int(year_row[c]))
+    # Try exact match first
+    if os.path.exists(default_filename):
+        data_source = default_filename
+    else:
+        # Try case-insensitive match in current directory
+        files = [f for f in os.listdir('.') if os.path.isfile(f)]
+        for f in files:
+            if f.lower() == default_filename.lower():
+                data_source = f
+                break
+
+    if not data_source:
+        st.warning(f"⚠️ '{default_filename}' not found in the current directory. Please upload the data file.")
+        uploaded_file = st.sidebar.file_uploader("Upload Data File", type=["xlsx"])
+        if uploaded_file:
+            data_source = uploaded_file
+
+    if not data_source:
+        st.info("Waiting for data file...")
+        st.stop()
+
+    if isinstance(data_source, str):
+        # The default workbook first, then every other workbook next to it
+        sources = tuple(workbook_sources(data_source))
+    else:
+        sources = (data_source,)
 
-        # Drop missing values
-        long_df = long_df.dropna(subset=["value"])
+    # Created before the first catalog load, so its baseline excludes the data
+    session_tracker()
 
-        return long_df
+    try:
+        catalog = load_catalog(sources)
     except Exception as e:
         st.error(f"Error loading data: {e}")
-        return pd.DataFrame()
-
-# Check if default file exists (case-insensitive search)
-default_filename = "Results.xlsx"
-data_source = None
+        st.stop()
 
-# Try exact match first
-if os.path.exists(default_filename):
-    data_source = default_filename
-else:
-    # Try case-insensitive match in current directory
-    files = [f for f in os.listdir('.') if os.path.isfile(f)]
-    for f in files:
-        if f.lower() == default_filename.lower():
-            data_source = f
-            break
+    # Picks up workbooks changed on disk; the reload runs in the background and is
+    # swapped in atomically, so this rerun keeps using the current data
+    catalog.refresh()
+    start_chart_warm_up(sources, catalog.version)
 
-if not data_source:
-    st.warning(f"⚠️ '{default_filename}' not found in the current directory. Please upload the data file.")
-    uploaded_file = st.sidebar.file_uploader("Upload Data File", type=["xlsx"])
-    if uploaded_file:
-        data_source = uploaded_file
+    if not catalog.domains:
+        st.error("No data sheets found. Expected a 'Domain' / 'Question' row under the country header.")
+        st.stop()
 
-if data_source:
-    long_df = load_long_data(data_source)
-else:
-    st.info("Waiting for data file...")
-    st.stop()
+    checkpoint("load_catalog")
 
 
 
-# -------------------------------------------------
-# Sidebar controls
-# -------------------------------------------------
-st.sidebar.header("⚙️ Configuration")
+    # -------------------------------------------------
+    # Sidebar controls
+    # -------------------------------------------------
+    st.sidebar.header("⚙️ Configuration")
+    data_caption = st.sidebar.empty()
 
-# --- Data Selection ---
-with st.sidebar.expander("1. Data Selection", expanded=True):
-    # Domain
-    domains = sorted(long_df["Domain"].unique())
-    selected_domain = st.selectbox("Domain", domains)
+    # --- Data Selection ---
+    with st.sidebar.expander("1. Data Selection", expanded=True):
+        # Domain
+        domains = catalog.domains
+        selected_domain = st.selectbox("Domain", domains)
     
-    dom_df = long_df[long_df["Domain"] == selected_domain]
+        # Precomputed per-domain options; loads the domain's sheets on first use
+        filter_index = load_domain_index(sources, selected_domain)
+        dom_options = filter_index.options[selected_domain]
     
-    # Show availability info
-    avail_years = sorted(dom_df["Year"].unique())
-    if avail_years:
-        st.caption(f"📅 Data available: {min(avail_years)} - {max(avail_years)}")
+        # Show availability info
+        avail_years = dom_options["years"]
+        if avail_years:
+            st.caption(f"📅 Data available: {min(avail_years)} - {max(avail_years)}")
     
-    # Questions within domain
-    questions = sorted(dom_df["Question"].unique())
+        # Questions within domain
+        questions = dom_options["questions"]
     
-    # --- Select All / Clear All Buttons ---
-    c_all, c_clear = st.columns(2)
+        # --- Select All / Clear All Buttons ---
+        c_all, c_clear = st.columns(2)
     
-    # We use a session state key for the multiselect to allow buttons to control it
-    if "selected_questions_key" not in st.session_state:
-        st.session_state.selected_questions_key = [questions[0]] if questions else []
+        # We use a session state key for the multiselect to allow buttons to control it
+        if "selected_questions_key" not in st.session_state:
+            st.session_state.selected_questions_key = [questions[0]] if questions else []
         
-    if c_all.button("Select All"):
-        st.session_state.selected_questions_key = questions
-        st.rerun()
+        if c_all.button("Select All"):
+            st.session_state.selected_questions_key = questions
+            st.rerun()
         
-    if c_clear.button("Clear All"):
-        st.session_state.selected_questions_key = []
-        st.rerun()
-
-    selected_questions = st.pills(
-        "Indicators (questions)",
-        questions,
-        selection_mode="multi",
-        key="selected_questions_key"
-    )
-    
-    # Countries
-    countries = sorted(dom_df["Country"].unique())
-    selected_countries = st.multiselect(
-        "Countries",
-        countries,
-        default=countries
-    )
+        if c_clear.button("Clear All"):
+            st.session_state.selected_questions_key = []
+            st.rerun()
+
+        selected_questions = st.pills(
+            "Indicators (questions)",
+            questions,
+            selection_mode="multi",
+            key="selected_questions_key"
+        )
     
-    # Year range
-    years = sorted(dom_df["Year"].unique())
-    if years:
-        y_min, y_max = int(min(years)), int(max(years))
-        selected_year_range = st.slider(
-            "Year range",
-            y_min, y_max,
-            (y_min, y_max)
+        # Countries
+        countries = dom_options["countries"]
+        selected_countries = st.multiselect(
+            "Countries",
+            countries,
+            default=countries
         )
-    else:
-        selected_year_range = (0, 0)
-
-# --- Visual Settings ---
-with st.sidebar.expander("2. Visual Settings", expanded=False):
-    # Chart Type
-    chart_type = st.selectbox(
-        "Chart Type",
-        ["Line Chart", "Bar Chart"],
-        index=0
-    )
+    
+        # Year range
+        years = dom_options["years"]
+        if years:
+            y_min, y_max = int(min(years)), int(max(years))
+            selected_year_range = st.slider(
+                "Year range",
+                y_min, y_max,
+                (y_min, y_max)
+            )
+        else:
+            selected_year_range = (0, 0)
 
-    # Layout
-    layout = st.radio(
-        "Plot layout",
-        ["Single figure (all countries)", "Country panels"],
-        index=0
+    data_caption.caption(
+        f"🗄️ {len(catalog.sheets)} sheet(s) in catalog · {catalog.loaded_rows():,} data points loaded · "
+        f"{catalog.memory_footprint() / 1024:,.0f} KB in memory"
+        + (" · 🔄 reloading changed workbooks…" if catalog.reloading else "")
     )
+
+    # --- Visual Settings ---
+    with st.sidebar.expander("2. Visual Settings", expanded=False):
+        # Chart Type
+        chart_type = st.selectbox(
+            "Chart Type",
+            ["Line Chart", "Bar Chart"],
+            index=0
+        )
+
+        # Layout
+        layout = st.radio(
+            "Plot layout",
+            ["Single figure (all countries)", "Country panels"],
+            index=0
+        )
     
-    # Show column control if we are faceting (either by country or by indicator)
-    show_grid_control = (layout == "Country panels") or (layout == "Single figure (all countries)" and len(selected_questions) > 1)
+        # Show column control if we are faceting (either by country or by indicator)
+        show_grid_control = (layout == "Country panels") or (layout == "Single figure (all countries)" and len(selected_questions) > 1)
     
-    grid_columns = 2
-    if show_grid_control:
-        grid_columns = st.slider("Grid columns (width)", 1, 6, 2)
+        grid_columns = 2
+        combine_panels = False
+        if show_grid_control:
+            grid_columns = st.slider("Grid columns (width)", 1, 6, 2)
+            combine_panels = st.toggle(
+                "Combine panels into one chart",
+                value=False,
+                help="Sends the data once as a single faceted chart. Faster with many countries or indicators."
+            )
 
 
     
-    # Graph style
-    graph_style = st.selectbox(
-        "Graph style",
-        [
-            "Colorblind-safe (default)",
-            "Monochrome (blue shades)",
-            "Black & white (line styles)",
-            "Highlight focal country"
-        ],
-        index=0
-    )
-    
-    # Theme presets
-    theme = st.selectbox(
-        "Theme preset",
-        [
-            "Academic (light)",
-            "OECD grey",
-            "Dark dashboard",
-            "Pastel report",
-            "The Economist",
-            "Financial Times"
-        ],
-        index=0
-    )
+        # Graph style
+        graph_style = st.selectbox(
+            "Graph style",
+            [
+                "Colorblind-safe (default)",
+                "Monochrome (blue shades)",
+                "Black & white (line styles)",
+                "Highlight focal country"
+            ],
+            index=0
+        )
     
-    # Focal country
-    focal_country = None
-    if graph_style == "Highlight focal country":
-        focal_country = st.selectbox(
-            "Focal country",
-            countries,
+        # Theme presets
+        theme = st.selectbox(
+            "Theme preset",
+            [
+                "Academic (light)",
+                "OECD grey",
+                "Dark dashboard",
+                "Pastel report",
+                "The Economist",
+                "Financial Times"
+            ],
             index=0
         )
-
-# -------------------------------------------------
-# Filtered data for plotting
-# -------------------------------------------------
-if not selected_questions or not selected_countries:
-    st.warning("Please select at least one indicator and one country.")
-    st.stop()
-
-plot_df = dom_df[
-    (dom_df["Question"].isin(selected_questions)) &
-    (dom_df["Country"].isin(selected_countries)) &
-    (dom_df["Year"].between(selected_year_range[0], selected_year_range[1]))
-]
-
-if plot_df.empty:
-    st.warning("No data for this combination. Try widening the year range or adding countries.")
-    st.stop()
-
-# Check for missing countries
-present_countries = set(plot_df["Country"].unique())
-missing_countries = set(selected_countries) - present_countries
-if missing_countries:
-    st.warning(f"⚠️ The following countries have no data for the selected period and are not shown: {', '.join(sorted(missing_countries))}")
-
-
-# -------------------------------------------------
-# Main Content: Dashboard Layout
-# -------------------------------------------------
-
-tab1, tab2 = st.tabs(["📈 Dashboard", "ℹ️ Variable Definitions"])
-
-with tab1:
-    # --- 1. KPI Metrics ---
-    m1, m2, m3, m4 = st.columns(4)
-    m1.metric("Countries", len(selected_countries))
-    m2.metric("Indicators", len(selected_questions))
-    m3.metric("Years", f"{selected_year_range[0]} - {selected_year_range[1]}")
-    m4.metric("Data Points", len(plot_df))
-
-    st.divider()
-
-    # --- 2. Chart Section ---
-    st.subheader(f"📈 Analysis: {selected_domain}")
-
-    # --- Style helpers ---
-    def get_country_color_encoding():
-        """Color mapping for countries, depending on graph style."""
-        if graph_style == "Colorblind-safe (default)":
-            palette = [
-                "#1b9e77", "#d95f02", "#7570b3", "#e7298a",
-                "#66a61e", "#e6ab02", "#a6761d", "#666666"
-            ]
-            return alt.Color(
-                "Country:N",
-                title="Country",
-                scale=alt.Scale(range=palette)
+    
+        # Focal country
+        focal_country = None
+        if graph_style == "Highlight focal country":
+            focal_country = st.selectbox(
+                "Focal country",
+                countries,
+                index=0
             )
 
-        if graph_style == "Monochrome (blue shades)":
-            return alt.Color(
-                "Country:N",
-                title="Country",
-                scale=alt.Scale(scheme="blues")
+    # --- Memory ---
+    with st.sidebar.expander("🧠 Server memory", expanded=False):
+        ctx = get_script_run_ctx()
+        if ctx is not None:
+            session_tracker().touch(ctx.session_id)
+        store_bytes, view_bytes = catalog.memory_footprint(), views_footprint()
+        mem = memory_report(store_bytes + view_bytes, session_tracker().active(), session_tracker().baseline)
+        st.caption(
+            f"Shared: data store {store_bytes / 1024**2:,.1f} MB · view cache {view_bytes / 1024**2:,.1f} MB "
+            "(one copy for all sessions)"
+        )
+        if mem["rss"] is not None:
+            st.caption(
+                f"Process resident memory: {mem['rss'] / 1024**2:,.1f} MB"
+                + (f" ({mem['baseline'] / 1024**2:,.1f} MB at startup)" if mem["baseline"] is not None else "")
             )
-
-        if graph_style == "Highlight focal country" and focal_country is not None:
-            return alt.condition(
-                alt.datum.Country == focal_country,
-                alt.value("#1f77b4"),   # highlight
-                alt.value("#CCCCCC")    # others
+        if mem["per_session"] is not None:
+            st.caption(
+                f"Active sessions: {mem['sessions']} · ≈ {mem['per_session'] / 1024**2:,.1f} MB per session "
+                "on average (memory above the startup baseline that is not shared)"
             )
 
-        return alt.value("black")
+    checkpoint("sidebar")
+
+    # -------------------------------------------------
+    # Filtered data for plotting
+    # -------------------------------------------------
+    if not selected_questions or not selected_countries:
+        st.warning("Please select at least one indicator and one country.")
+        st.stop()
+
+    view = build_view(
+        sources,
+        catalog.version,
+        selected_domain,
+        selected_questions,
+        selected_countries,
+        selected_year_range,
+        chart_type,
+        layout,
+        graph_style,
+        theme,
+        focal_country,
+        grid_columns if combine_panels else None
+    )
+    plot_df = view.plot_df
+    checkpoint("build_view")
+
+    if plot_df.empty:
+        st.warning("No data for this combination. Try widening the year range or adding countries.")
+        st.stop()
+
+    # Check for missing countries
+    present_countries = set(plot_df["Country"].unique())
+    missing_countries = set(selected_countries) - present_countries
+    if missing_countries:
+        st.warning(f"⚠️ The following countries have no data for the selected period and are not shown: {', '.join(sorted(missing_countries))}")
+
+
+    # -------------------------------------------------
+    # Main Content: Dashboard Layout
+    # -------------------------------------------------
+
+    tab1, tab2 = st.tabs(["📈 Dashboard", "ℹ️ Variable Definitions"])
+
+    with tab1:
+        # --- 1. KPI Metrics ---
+        m1, m2, m3, m4 = st.columns(4)
+        m1.metric("Countries", len(selected_countries))
+        m2.metric("Indicators", len(selected_questions))
+        m3.metric("Years", f"{selected_year_range[0]} - {selected_year_range[1]}")
+        m4.metric("Data Points", len(plot_df))
+
+        # --- Country comparison (cross-country statistics precomputed per domain) ---
+        with st.expander("🏅 Country comparison", expanded=False):
+            compare_country = st.selectbox(
+                "Compare country",
+                selected_countries,
+                index=selected_countries.index(focal_country) if focal_country in selected_countries else 0
+            )
+            comparison = []
+            for q in selected_questions:
+                r = filter_index.stats.latest(selected_domain, q, compare_country, selected_year_range)
+                if r is not None:
+                    comparison.append({
+                        "Indicator": q,
+                        "Year": r["Year"],
+                        "Value": r["value"],
+                        "Mean": r["mean"],
+                        "Median": r["median"],
+                        "Rank": f"{r['rank']} of {r['countries']}",
+                        "Percentile": r["pct_rank"],
+                        "Change": r["change"],
+                        "Previous wave": r["prev_year"],
+                    })
+            if comparison:
+                first = comparison[0]
+                k1, k2, k3 = st.columns(3)
+                k1.metric(
+                    f"{first['Indicator']} ({first['Year']})", f"{first['Value']:.3f}",
+                    delta=None if first["Previous wave"] is None else f"{first['Change']:+.3f} since {first['Previous wave']}"
+                )
+                k2.metric("Rank", first["Rank"])
+                k3.metric("Percentile", f"{first['Percentile']:.0f}")
+                st.dataframe(comparison, width="stretch", hide_index=True)
+                st.caption("Latest wave in the year range; mean, median and rank are across all countries surveyed that year.")
+            else:
+                st.caption(f"No data for {compare_country} in the selected years.")
 
+        st.divider()
 
-    def get_stroke_dash_encoding():
-        """Line style mapping (used for black & white)."""
-        if graph_style == "Black & white (line styles)":
-            return alt.StrokeDash(
-                "Country:N",
-                title="Country",
-                sort=selected_countries
-            )
-        return alt.value([1, 0])
-
-
-    def style_chart(chart: alt.Chart) -> alt.Chart:
-        """Apply theme preset: fonts, fill, grid, legend, etc."""
-        chart = chart.configure_axis(
-            labelFontSize=13,
-            titleFontSize=15
-        ).configure_legend(
-            titleFontSize=14,
-            labelFontSize=12
-        ).configure_title(
-            fontSize=18,
-            anchor="start"
-        )
+        # --- 2. Chart Section ---
+        st.subheader(f"📈 Analysis: {selected_domain}")
 
-        if theme == "Academic (light)":
-            chart = chart.configure_view(strokeWidth=0, fill="white").configure_axis(grid=True, gridColor="#DDDDDD")
-        elif theme == "OECD grey":
-            chart = chart.configure_view(stroke="#CCCCCC", strokeWidth=1, fill="white").configure_axis(grid=True, gridColor="#E0E0E0")
-        elif theme == "Dark dashboard":
-            chart = chart.configure_view(strokeWidth=0, fill="#111111").configure_axis(
-                labelColor="white", titleColor="white", grid=True, gridColor="#333333"
-            ).configure_legend(titleColor="white", labelColor="white").configure_title(color="white")
-        elif theme == "Pastel report":
-            chart = chart.configure_view(strokeWidth=0, fill="#FAFAFA").configure_axis(grid=True, gridColor="#F0F0F0")
-        elif theme == "The Economist":
-            # Economist style: Blue-gray background, horizontal grid only usually, but we keep grid simple
-            chart = chart.configure_view(strokeWidth=0, fill="#d5e4eb").configure_axis(
-                grid=True, gridColor="white", labelFont="Verdana", titleFont="Verdana"
-            ).configure_title(font="Verdana", fontSize=20).configure_legend(labelFont="Verdana", titleFont="Verdana")
-        elif theme == "Financial Times":
-            # FT style: Salmon/Pinkish background
-            chart = chart.configure_view(strokeWidth=0, fill="#fff1e0").configure_axis(
-                grid=True, gridColor="#e3cbb0", labelFont="Georgia", titleFont="Georgia"
-            ).configure_title(font="Georgia", fontSize=20).configure_legend(labelFont="Georgia", titleFont="Georgia")
-
-        return chart
-
-    color_encoding = get_country_color_encoding()
-    stroke_dash_encoding = get_stroke_dash_encoding()
-
-    # --- Plotting Logic ---
-
-    def create_single_chart(data, title_text, x_axis_title="Year", y_axis_title="Value", color_enc=None, dash_enc=None, x_off=None):
-        base = alt.Chart(data)
-        if chart_type == "Bar Chart":
-            mark = base.mark_bar()
+        # --- Plotting Logic ---
+        if combine_panels or (layout == "Single figure (all countries)" and len(selected_questions) == 1):
+            # One indicator or combined panels -> Single chart
+            slots = [st.empty()]
         else:
-            mark = base.mark_line(point=True)
-        
-        chart = mark.encode(
-            x=alt.X("Year:O", title=x_axis_title),
-            y=alt.Y("value:Q", title=y_axis_title),
-            color=color_enc,
-            strokeDash=dash_enc,
-            xOffset=x_off,
-            tooltip=["Country", "Year", "Question", "value"]
-        ).properties(
-            title=title_text,
-            height=450 # Fixed height, width will be responsive
-        )
-        return style_chart(chart)
-
-    if layout == "Single figure (all countries)":
-        if len(selected_questions) > 1:
-            # Multiple indicators -> Grid of charts, one per indicator
+            # Grid of charts, one per indicator or per country, a page at a time
+            page_size = max(grid_columns, PANELS_PER_PAGE // grid_columns * grid_columns)
+            view_key = (selected_domain, tuple(selected_questions), tuple(selected_countries), selected_year_range, layout)
+            if st.session_state.get("panel_view_key") != view_key:
+                st.session_state.panel_view_key = view_key
+                st.session_state.panel_limit = page_size
             cols = st.columns(grid_columns)
-            for i, q in enumerate(selected_questions):
-                # Filter data for this question
-                q_data = plot_df[plot_df["Question"] == q]
-                
-                # Create chart
-                chart = create_single_chart(
-                    q_data, 
-                    title_text=f"{q}",
-                    y_axis_title="Value",
-                    color_enc=color_encoding,
-                    dash_enc=stroke_dash_encoding if chart_type == "Line Chart" else alt.value([0,0]),
-                    x_off="Country:N" if chart_type == "Bar Chart" else alt.value(0)
-                )
-                
-                # Place in column
-                with cols[i % grid_columns]:
-                    st.altair_chart(chart, use_container_width=True)
-                    
-        else:
-            # One indicator -> Single chart
-            chart = create_single_chart(
-                plot_df,
-                title_text=f"{selected_questions[0]} – {selected_domain}",
-                y_axis_title=selected_questions[0],
-                color_enc=color_encoding,
-                dash_enc=stroke_dash_encoding if chart_type == "Line Chart" else alt.value([0,0]),
-                x_off="Country:N" if chart_type == "Bar Chart" else alt.value(0)
+            slots = [cols[i % grid_columns].empty() for i in range(min(len(view), st.session_state.panel_limit))]
+        for slot in slots:
+            slot.caption("⏳ Building chart…")
+
+        # Panels appear as their specs are ready; a rerun stops this loop and
+        # cancels the panels not started yet. Panels beyond the shown pages are not built
+        specs = view.specs(range(len(slots)))
+        try:
+            for i, spec in specs:
+                slots[i].vega_lite_chart(view.frames[i], spec, width="stretch")
+        finally:
+            specs.close()
+
+        if len(slots) < len(view):
+            more = min(page_size, len(view) - len(slots))
+            if st.button(f"Show {more} more panels ({len(slots)} of {len(view)} shown)", width="stretch"):
+                st.session_state.panel_limit += page_size
+                st.rerun()
+
+        if any("low" in frame.columns for frame in view.frames):
+            st.caption(
+                f"ℹ️ Charts are limited to {MAX_CHART_POINTS:,} points each: the remaining series are shown "
+                f"as '{OTHERS_LABEL}' with their min–max range. Exports and the data view hold every row."
             )
-            st.altair_chart(chart, use_container_width=True)
-
-    else:
-        # Country panels -> Grid of charts, one per country
-        if graph_style == "Black & white (line styles)":
-            panel_color = alt.value("black")
-            panel_dash = alt.StrokeDash("Question:N", title="Indicator")
-        else:
-            panel_color = alt.Color("Question:N", title="Indicator")
-            panel_dash = alt.value([1, 0])
-            
-        cols = st.columns(grid_columns)
-        for i, country in enumerate(selected_countries):
-            # Filter data for this country
-            c_data = plot_df[plot_df["Country"] == country]
-            
-            if c_data.empty: continue
-
-            # Create chart
-            chart = create_single_chart(
-                c_data,
-                title_text=f"{country}",
-                y_axis_title="Value",
-                color_enc=panel_color,
-                dash_enc=panel_dash if chart_type == "Line Chart" else alt.value([0,0]),
-                x_off="Question:N" if chart_type == "Bar Chart" else alt.value(0)
+        drawn = set().union(*(set(frame["Question"].unique()) for frame in view.frames)) if view.frames else set()
+        if view.frames and len(drawn) < plot_df["Question"].nunique():
+            st.caption(
+                f"ℹ️ Charts are limited to {MAX_CHART_POINTS:,} points each: country panels show the first "
+                f"{len(drawn)} of the {plot_df['Question'].nunique()} selected indicators. Exports and the data "
+                "view hold every row."
             )
-            
-            # Place in column
-            with cols[i % grid_columns]:
-                st.altair_chart(chart, use_container_width=True)
-
 
+        checkpoint("render_charts")
 
-    # --- 3. Footer / Export ---
-    st.divider()
+        # --- 3. Footer / Export ---
+        st.divider()
     
-    # --- Selected Indicator Definitions ---
-    if selected_questions:
-        st.subheader("📖 Indicator Definitions")
-        from info_content import get_schema_dict, get_item_descriptions
-        schema = get_schema_dict()
-        item_descs = get_item_descriptions()
+        # --- Selected Indicator Definitions ---
+        if selected_questions:
+            st.subheader("📖 Indicator Definitions")
+            schema = get_schema_dict()
         
-        for q in selected_questions:
-            info = schema.get(q)
-            if info:
-                with st.expander(f"ℹ️ {q}", expanded=False):
-                    items_used = info.get('Items Used', 'N/A')
-                    st.markdown(f"""
-                    - **Interpretation**: {info.get('Interpretation', 'N/A')}
-                    - **Method**: {info.get('Method', 'N/A')}
-                    - **Items Used**: {items_used}
-                    - **Domain**: {info.get('Domain', 'N/A')}
-                    """)
+            for q in selected_questions:
+                info = schema.get(q)
+                if info:
+                    with st.expander(f"ℹ️ {q}", expanded=False):
+                        items_used = info.get('Items Used', 'N/A')
+                        st.markdown(f"""
+                        - **Interpretation**: {info.get('Interpretation', 'N/A')}
+                        - **Method**: {info.get('Method', 'N/A')}
+                        - **Items Used**: {items_used}
+                        - **Domain**: {info.get('Domain', 'N/A')}
+                        """)
                     
-                    # Try to find relevant item descriptions
-                    found_items = []
-                    # Simple heuristic: check if any known item code is present in the "Items Used" string
-                    # or if the item code is part of a range (e.g. A065 in A065-A074)
-                    # Since ranges are hard to parse perfectly without logic, we'll just iterate all items 
-                    # and see if they "look like" they belong.
-                    # Actually, let's just check if the item code appears in the string first.
-                    
-                    # Better approach: Iterate through all item codes. If the code is in the string, add it.
-                    # For ranges like A065-A074, the string contains "A065" and "A074". 
-                    # Intermediate items (A066) won't be found by simple string search.
-                    # But often the text description has them all. 
-                    # Let's try a smarter check: 
-                    # 1. Exact match in string
-                    # 2. Range check?
-                    
-                    # For now, let's just show items that are explicitly mentioned or if we can parse the range.
-                    # Let's do a simple check: if the item code is a substring of "Items Used", show it.
-                    # This misses the "middle" of ranges.
-                    
-                    # Let's try to parse ranges in "Items Used"
-                    # e.g. "A065–A074" -> A065, A074 and everything in between?
-                    # Since codes are alphanumeric, "in between" is tricky.
-                    # But we have the list of ALL items. We can sort them.
-                    
-                    relevant_items = []
-                    for code, desc in item_descs.items():
-                        # Check if code is in items_used string
-                        if code in items_used:
-                            relevant_items.append(f"- **{code}**: {desc}")
-                        else:
-                            # Check for range: "START-END"
-                            # If code is lexicographically between START and END, and shares prefix
-                            import re
-                            # Match ranges like A065-A074 or A065–A074
-                            ranges = re.findall(r'([A-Z]\d+)[-–—]([A-Z]\d+)', items_used)
-                            for start, end in ranges:
-                                # Check if same prefix
-                                if start[0] == end[0] == code[0]:
-                                    # Check numeric part
-                                    try:
-                                        s_num = int(start[1:])
-                                        e_num = int(end[1:])
-                                        c_num = int(code[1:])
-                                        if s_num <= c_num <= e_num:
-                                            relevant_items.append(f"- **{code}**: {desc}")
-                                            break
-                                    except:
-                                        pass
-
-                    if relevant_items:
-                        st.markdown("**Constituent Items:**")
-                        # Deduplicate and sort
-                        relevant_items = sorted(list(set(relevant_items)))
-                        for item_txt in relevant_items:
-                            st.markdown(item_txt)
-
-            else:
-                pass
-
-    st.divider()
-    with st.expander("📥 Export & Data View", expanded=False):
-        c1, c2 = st.columns([1, 3])
-        with c1:
-            st.markdown("### Download")
-            csv = plot_df.to_csv(index=False).encode('utf-8')
-            st.download_button(
-                "Download CSV",
-                csv,
-                "filtered_data.csv",
-                "text/csv",
-                key='download-csv',
-                use_container_width=True
-            )
-            
-            buffer = io.BytesIO()
-            with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-                plot_df.to_excel(writer, sheet_name='Data', index=False)
-            
-            st.download_button(
-                "Download Excel",
-                buffer.getvalue(),
-                "filtered_data.xlsx",
-                "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                key='download-excel',
-                use_container_width=True
-            )
+                        # Item codes (ranges expanded) are resolved once, on first use, in info_content
+                        relevant_items = get_variable_items().get(q, ())
+                        if relevant_items:
+                            st.markdown("**Constituent Items:**")
+                            for code, desc in relevant_items:
+                                st.markdown(f"- **{code}**: {desc}")
+
+                else:
+                    pass
+
+        checkpoint("indicator_definitions")
+
+        st.divider()
+        with st.expander("📥 Export & Data View", expanded=False):
+            c1, c2 = st.columns([1, 3])
+            with c1:
+                st.markdown("### Download")
+                # Files are only built when a button is clicked, off the script thread
+                for fmt, label in [("csv", "Download CSV"), ("xlsx", "Download Excel"), ("parquet", "Download Parquet")]:
+                    _, file_name, mime = EXPORT_FORMATS[fmt]
+                    export = partial(
+                        build_export, sources, catalog.version, fmt, selected_domain,
+                        selected_questions, selected_countries, selected_year_range
+                    )
+                    if profiler is not None:
+                        # Downloads run after the script run, so they are logged on their own
+                        export = partial(run_profiled, f"export_{fmt}", export)
+                    st.download_button(
+                        label,
+                        export,
+                        file_name,
+                        mime,
+                        key=f'download-{fmt}',
+                        width="stretch"
+                    )
         
-        with c2:
-            st.markdown("### Raw Data Preview")
-            st.dataframe(plot_df, height=200, use_container_width=True)
-
-with tab2:
-    st.markdown(variable_info_md)
-
-
+            with c2:
+                st.markdown("### Raw Data Preview")
+                # Only one page of rows is sent to the browser
+                n_pages = max(1, -(-len(plot_df) // PREVIEW_ROWS))
+                page = st.number_input("Page", 1, n_pages, 1) if n_pages > 1 else 1
+                start = (page - 1) * PREVIEW_ROWS
+                st.dataframe(plot_df.iloc[start:start + PREVIEW_ROWS], height=200, width="stretch")
+                st.caption(f"Rows {start + 1:,}–{min(start + PREVIEW_ROWS, len(plot_df)):,} of {len(plot_df):,}")
+
+    with tab2:
+        st.markdown(variable_info_md)
+
+    # -------------------------------------------------
+    # Rerun profile (debug)
+    # -------------------------------------------------
+    if profiler is not None:
+        checkpoint("export_and_preview")
+        with st.expander("⏱️ Rerun profile", expanded=False):
+            st.caption(f"Total {profiler.total_ms():,.1f} ms · appended to the JSONL profile log")
+            st.dataframe(profiler.summary(), width="stretch", hide_index=True)
+            st.dataframe(profiler.records, width="stretch", hide_index=True)
+
+
+# Opt-in rerun profiler (?profile=1 or RTOOL_PROFILE=1); activated on every run
+# so a profiler left over from an earlier run on this thread is cleared
+_ctx = get_script_run_ctx()
+profiler = RerunProfiler(_ctx.session_id if _ctx else None) if profiling_enabled(st.query_params) else None
+with profiled_run(profiler):
+    render_page()
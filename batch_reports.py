@@ -0,0 +1,159 @@
+"""Headless batch renderer: charts for every domain × country set, without Streamlit.
+
+Uses the same loading, filtering and chart code as RTool.py and writes one file
+per panel and format:
+
+    python batch_reports.py --out reports --formats svg html \
+        --country-set nordic=Finland,Sweden --country-set all
+
+PNG and SVG output need the optional vl-convert-python package; HTML does not.
+Data comes from the same catalog as the app: --data first, then every other
+workbook in its folder. Work is spread over a process pool. Workers inherit
+the loaded domains through fork where available; otherwise each builds its
+own catalog and loads its domains from the Parquet snapshots.
+"""
+import argparse
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import altair as alt
+
+from charts import COUNTRY_PANELS, PANEL_ROW_WIDTH, SINGLE_FIGURE, build_panel_charts
+from catalog import DatasetCatalog, workbook_sources
+
+# Set in the parent before the pool starts (inherited on fork) or by _init_worker
+_catalog = None
+
+
+def slugify(text: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "-", str(text)).strip("-").lower() or "item"
+
+
+def _init_worker(sources: list) -> None:
+    global _catalog
+    if _catalog is None:
+        _catalog = DatasetCatalog(sources)
+
+
+def render_report(task: dict) -> list:
+    """Renders all panels of one domain × country set; returns the written paths."""
+    domain, countries = task["domain"], task["countries"]
+    index = _catalog.domain_index(domain)
+    options = index.options[domain]
+    countries = [c for c in (countries or options["countries"]) if c in options["countries"]]
+    questions = options["questions"]
+    if not countries or not questions:
+        return []
+
+    year_range = (options["years"][0], options["years"][-1])
+    plot_df = index.filter(domain, questions, countries, year_range)
+    if plot_df.empty:
+        return []
+
+    panels = build_panel_charts(
+        plot_df, domain, questions, countries,
+        task["chart_type"], task["layout"], task["graph_style"], task["theme"],
+        task["focal_country"], task["facet_columns"]
+    )
+
+    folder = os.path.join(task["out"], slugify(domain), slugify(task["set_name"]))
+    os.makedirs(folder, exist_ok=True)
+
+    written = []
+    for i, (_, chart) in enumerate(panels, start=1):
+        if isinstance(chart, alt.Chart):
+            # Static output has no container to stretch into
+            chart = chart.properties(width=PANEL_ROW_WIDTH // 2)
+        title = chart.title if isinstance(chart.title, str) else domain
+        stem = os.path.join(folder, f"{i:03d}-{slugify(title)}")
+        for fmt in task["formats"]:
+            path = f"{stem}.{fmt}"
+            chart.save(path, format=fmt)
+            written.append(path)
+    return written
+
+
+def parse_country_sets(values) -> dict:
+    """NAME=C1,C2 entries -> {NAME: [C1, C2]}; "all" (or no entry) means every country."""
+    sets = {}
+    for value in values or ["all"]:
+        name, _, members = value.partition("=")
+        sets[name] = [c.strip() for c in members.split(",") if c.strip()] or None
+    return sets
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data", default="Results.xlsx", help="Main workbook; others in its folder are included")
+    parser.add_argument("--out", default="reports", help="Output folder")
+    parser.add_argument("--domains", nargs="*", help="Domains to render (default: all)")
+    parser.add_argument("--country-set", action="append", dest="country_sets",
+                        help="NAME=Country1,Country2 (repeatable); 'all' for every country")
+    parser.add_argument("--formats", nargs="+", default=["svg"], choices=["png", "svg", "html"])
+    parser.add_argument("--chart-type", default="Line Chart", choices=["Line Chart", "Bar Chart"])
+    parser.add_argument("--layout", default=COUNTRY_PANELS, choices=[SINGLE_FIGURE, COUNTRY_PANELS])
+    parser.add_argument("--graph-style", default="Colorblind-safe (default)")
+    parser.add_argument("--theme", default="Academic (light)")
+    parser.add_argument("--focal-country")
+    parser.add_argument("--combine", type=int, metavar="COLUMNS",
+                        help="Render multi-panel layouts as one faceted chart with this many columns")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    if {"png", "svg"} & set(args.formats):
+        try:
+            import vl_convert  # noqa: F401
+        except ImportError:
+            parser.error("PNG/SVG output needs the vl-convert-python package")
+
+    global _catalog
+    sources = workbook_sources(args.data)
+    _catalog = DatasetCatalog(sources)
+
+    domains = args.domains or _catalog.domains
+    unknown = sorted(set(domains) - set(_catalog.domains))
+    if unknown:
+        parser.error(f"unknown domain(s): {', '.join(unknown)}")
+
+    # Loaded before the pool starts, so forked workers share them
+    t0 = time.perf_counter()
+    for domain in domains:
+        _catalog.domain_index(domain)
+    t_load = time.perf_counter() - t0
+
+    tasks = [
+        {
+            "domain": domain, "set_name": set_name, "countries": countries,
+            "chart_type": args.chart_type, "layout": args.layout,
+            "graph_style": args.graph_style, "theme": args.theme,
+            "focal_country": args.focal_country, "facet_columns": args.combine,
+            "formats": args.formats, "out": args.out,
+        }
+        for domain in domains
+        for set_name, countries in parse_country_sets(args.country_sets).items()
+    ]
+
+    # Fork shares the parent's table copy-on-write; spawn reloads it in each worker
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+
+    t0 = time.perf_counter()
+    written = []
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=context,
+                             initializer=_init_worker, initargs=(sources,)) as pool:
+        futures = {pool.submit(render_report, task): task for task in tasks}
+        for future in as_completed(futures):
+            task = futures[future]
+            paths = future.result()
+            written.extend(paths)
+            print(f"{task['domain']} / {task['set_name']}: {len(paths)} file(s)")
+
+    print(f"Loaded data in {t_load:.2f}s; wrote {len(written)} file(s) for "
+          f"{len(tasks)} report(s) in {time.perf_counter() - t0:.2f}s with {args.workers} worker(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Workbook parsing time per Excel engine, and sequential vs process-pool loading.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_excel [--sizes small medium large] [--workbooks 4]
+
+Engines that are not installed (e.g. python-calamine) are skipped. The pool
+comparison parses --workbooks copies of the largest size without snapshots.
+"""
+import argparse
+import glob
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+import data_loader
+from benchmarks.bench_suite import SIZES
+from benchmarks.synthetic import make_raw_sheet, write_workbook
+from benchmarks.timing import best_of
+from data_loader import available_excel_engines, load_sheets_cached, read_raw_sheet, reshape_long
+
+
+def remove_snapshots(folder: str) -> None:
+    for snap in glob.glob(os.path.join(folder, ".*.parquet")):
+        os.remove(snap)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", default=["small", "medium", "large"], choices=list(SIZES))
+    parser.add_argument("--workbooks", type=int, default=4, help="Workbooks for the pool comparison")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    engines = available_excel_engines()
+    print(f"Engines installed: {', '.join(engines)}; {os.cpu_count()} CPU(s)")
+
+    with tempfile.TemporaryDirectory() as folder:
+        print(f"\n{'size':<8}{'cells':>11}  {'engine':<10}{'seconds':>9}{'speedup':>9}")
+        for name in args.sizes:
+            n_countries, n_waves, n_questions = SIZES[name]
+            path = os.path.join(folder, f"{name}.xlsx")
+            write_workbook(path, make_raw_sheet(n_countries, n_waves, n_questions))
+
+            baseline = reference = None
+            for engine in engines[::-1]:
+                t, raw = best_of(lambda: read_raw_sheet(path, engine=engine), args.repeat)
+                long_df = reshape_long(raw)
+                if reference is None:
+                    baseline, reference = t, long_df
+                else:
+                    # Every engine must give the same long table
+                    pd.testing.assert_frame_equal(long_df, reference)
+                print(f"{name:<8}{n_countries * n_waves * n_questions:>11,}  {engine:<10}"
+                      f"{t:>9.3f}{baseline / t:>8.1f}x")
+
+        name = args.sizes[-1]
+        paths = [os.path.join(folder, f"{name}.xlsx")]
+        for i in range(1, args.workbooks):
+            copy = os.path.join(folder, f"{name}_{i}.xlsx")
+            write_workbook(copy, make_raw_sheet(*SIZES[name], seed=i))
+            paths.append(copy)
+
+        tasks = [(p, "Sheet1") for p in paths]
+        # Measure the pool even where the app would not use one
+        data_loader.PARALLEL_MIN_BYTES = 0
+        remove_snapshots(folder)
+        t0 = time.perf_counter()
+        load_sheets_cached(tasks, max_workers=1)
+        t_seq = time.perf_counter() - t0
+        remove_snapshots(folder)
+        t0 = time.perf_counter()
+        load_sheets_cached(tasks, max_workers=args.workers)
+        t_pool = time.perf_counter() - t0
+
+        print(f"\n{len(paths)} × {name} workbooks, engine {engines[0]}: "
+              f"sequential {t_seq:.2f}s, pool of {min(args.workers, len(paths))} {t_pool:.2f}s "
+              f"({t_seq / t_pool:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Cold-start cost of the app: import times and the first script run, in fresh processes.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_imports [--repeat 5] [--top 12] [--csv results.csv]
+
+Reports the median wall time of RTool.py's import block and of each app
+module imported on its own, the heaviest packages behind the import block
+(from `python -X importtime`), which optional heavy modules were loaded at
+startup (they should only load when their feature is used), and the time of
+a cold first script run. With --csv the medians are appended, with a
+timestamp and label, so container readiness can be tracked across releases.
+"""
+import argparse
+import ast
+import csv
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+APP = os.path.join(ROOT, "RTool.py")
+
+# Modules of the app, timed one by one
+APP_MODULES = ["info_content", "diagnostics", "data_loader", "data_index", "catalog", "charts",
+               "chart_cache", "rendering", "exports"]
+
+# Heavy modules that should load only when their feature is first used
+DEFERRED = ["altair", "xlsxwriter", "openpyxl", "python_calamine", "vl_convert"]
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - t0
+print(json.dumps({{"ms": elapsed * 1000, "loaded": [m for m in {deferred!r} if m in sys.modules]}}))
+"""
+
+_FIRST_RUN = """
+import json, logging, sys, time
+logging.disable(logging.WARNING)
+t0 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({app!r}, default_timeout=300).run()
+elapsed = time.perf_counter() - t0
+print(json.dumps({{"ms": elapsed * 1000, "loaded": [m for m in {deferred!r} if m in sys.modules],
+                  "errors": [e.message for e in at.exception]}}))
+"""
+
+
+def app_imports(path: str = APP) -> str:
+    """The top-level import statements of the app script."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    return "\n".join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+def run_probe(script: str, importtime: bool = False, env: dict = None):
+    """Runs `script` in a fresh interpreter; returns (its JSON result, -X importtime lines)."""
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", script]
+    proc = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True, env=env)
+    if proc.returncode:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    lines = [l for l in proc.stderr.splitlines() if l.startswith("import time:")]
+    return json.loads(proc.stdout.strip().splitlines()[-1]), lines
+
+
+def heaviest_packages(lines: list, top: int) -> list:
+    """(package, ms) from -X importtime output: the self time of all modules of each top-level package."""
+    totals = {}
+    for line in lines[1:]:
+        head, _, name = line.split("|", 2)
+        package = name.strip().split(".")[0]
+        totals[package] = totals.get(package, 0) + int(head.split(":")[1]) / 1000
+    return sorted(totals.items(), key=lambda kv: -kv[1])[:top]
+
+
+def median_probe(script: str, repeat: int, env: dict = None):
+    results = [run_probe(script, env=env)[0] for _ in range(repeat)]
+    return statistics.median(r["ms"] for r in results), results[-1]
+
+
+def append_csv(path: str, rows: list, label: str) -> None:
+    new = not os.path.exists(path)
+    stamp = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    with open(path, "a", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["time", "label", "python", "target", "ms"])
+        if new:
+            writer.writeheader()
+        for target, ms in rows:
+            writer.writerow({"time": stamp, "label": label, "python": platform.python_version(),
+                             "target": target, "ms": round(ms, 1)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh processes per measurement (median is reported)")
+    parser.add_argument("--top", type=int, default=12, help="Heaviest packages to list")
+    parser.add_argument("--no-first-run", action="store_true", help="Skip the cold first script run")
+    parser.add_argument("--csv", help="Append results to this CSV file")
+    parser.add_argument("--label", default="", help="Run label stored in the CSV (e.g. a release tag)")
+    args = parser.parse_args()
+
+    rows = []
+    startup = _PROBE.format(code=app_imports(), deferred=DEFERRED)
+    ms, result = median_probe(startup, args.repeat)
+    rows.append(("RTool imports", ms))
+
+    print(f"\n{'imported':<22}{'median ms':>10}")
+    print(f"{'RTool imports':<22}{ms:>10.0f}")
+    for module in APP_MODULES:
+        ms, _ = median_probe(_PROBE.format(code=f"import {module}", deferred=DEFERRED), args.repeat)
+        rows.append((module, ms))
+        print(f"{module:<22}{ms:>10.0f}")
+
+    _, lines = run_probe(startup, importtime=True)
+    print(f"\n{'package (RTool imports)':<26}{'ms':>8}")
+    for package, ms in heaviest_packages(lines, args.top):
+        print(f"{package:<26}{ms:>8.0f}")
+
+    loaded = result["loaded"]
+    print("\nDeferred modules loaded at startup: " + (", ".join(loaded) if loaded else "none"))
+
+    if not args.no_first_run:
+        # No warm-up and an unusable chart cache folder: the first view's charts are built
+        env = {**os.environ, "RTOOL_CHART_WARM_UP": "0", "RTOOL_CHART_CACHE": os.devnull}
+        ms, result = median_probe(_FIRST_RUN.format(app=APP, deferred=DEFERRED), args.repeat, env)
+        rows.append(("first run", ms))
+        print(f"Cold first script run (AppTest): {ms:.0f} ms; loaded {', '.join(result['loaded']) or 'none'}")
+        if result["errors"]:
+            print(f"  app errors: {result['errors']}")
+
+    if args.csv:
+        append_csv(args.csv, rows, args.label)
+        print(f"Appended {len(rows)} row(s) to {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Long-table build time and memory: per-cell (legacy) vs per-column (current) reshape.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_reshape [--countries 200 --waves 10 --questions 500]
+
+Also checks that incremental updates (update_long_data) of an edited sheet
+give the same rows as a full reshape, and times both.
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import make_raw_sheet
+from benchmarks.timing import best_of
+from data_loader import column_fingerprints, memory_footprint, reshape_long, update_long_data
+
+
+def reshape_long_legacy(raw: pd.DataFrame) -> pd.DataFrame:
+    """The original melt + per-cell lambda implementation, kept as the baseline."""
+    col0, col1 = raw.columns[0], raw.columns[1]
+    raw = raw.rename(columns={col0: "Domain", col1: "Question"})
+    year_row = raw.iloc[0]
+    data = raw.iloc[1:].reset_index(drop=True)
+    value_cols = [c for c in data.columns if c not in ["Domain", "Question"]]
+    data["Domain"] = data["Domain"].astype(str).str.strip()
+    data["Question"] = data["Question"].astype(str).str.strip()
+    long_df = data.melt(
+        id_vars=["Domain", "Question"],
+        value_vars=value_cols,
+        var_name="col",
+        value_name="value"
+    )
+    long_df["Country"] = long_df["col"].astype(str).str.split(".").str[0]
+    long_df["Year"] = long_df["col"].apply(lambda c: int(year_row[c]))
+    long_df["value"] = pd.to_numeric(long_df["value"], errors="coerce")
+    return long_df.dropna(subset=["value"])
+
+
+def edited_sheets(raw: pd.DataFrame) -> dict:
+    """Edited copies of `raw`, one per kind of workbook change update_long_data handles."""
+    value_cols = list(raw.columns[2:])
+    edits = {"unchanged": raw.copy()}
+
+    changed = raw.copy()
+    changed.loc[1:, value_cols[:3]] += 1.0
+    changed.loc[2, value_cols[3]] = np.nan
+    changed.loc[0, value_cols[4]] += 1  # wave moved to the next year
+    edits["changed columns"] = changed
+
+    added = raw.copy()
+    n_rows = len(raw) - 1
+    added["CountryNew"] = [2030] + list(np.linspace(0, 1, n_rows))
+    added["CountryNew.1"] = [2034] + [np.nan] * n_rows
+    edits["added columns"] = added
+
+    edits["removed columns"] = raw.drop(columns=value_cols[-2:])
+
+    relabeled = raw.copy()
+    relabeled.iloc[5, 1] = " Renamed question"
+    edits["changed label row"] = relabeled
+
+    mixed = changed.drop(columns=value_cols[-1:])
+    mixed["CountryNew"] = added["CountryNew"]
+    edits["mixed"] = mixed
+    return edits
+
+
+def same_rows(incremental: pd.DataFrame, full: pd.DataFrame) -> None:
+    """Asserts both long tables hold the same rows and dtypes, in any order."""
+    keys = ["Domain", "Question", "Country", "Year"]
+    for df in (incremental, full):
+        assert all(isinstance(df[c].dtype, pd.CategoricalDtype) for c in keys[:3])
+
+    def plain(df):
+        df = df.astype({c: str for c in keys[:3]})
+        return df.sort_values(keys).reset_index(drop=True)[list(full.columns)]
+
+    pd.testing.assert_frame_equal(plain(incremental), plain(full), check_exact=True)
+
+
+def check_incremental(raw: pd.DataFrame) -> None:
+    """Applies each edit incrementally and compares with a full reshape of the edited sheet."""
+    old_df, old_fingerprints = reshape_long(raw), column_fingerprints(raw)
+    print(f"\n{'edit':<20}{'rows':>10}{'update s':>10}{'full s':>10}")
+    for name, edited in edited_sheets(raw).items():
+        t0 = time.perf_counter()
+        incremental, _ = update_long_data(edited, old_df, old_fingerprints)
+        t_inc = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        full = reshape_long(edited)
+        t_full = time.perf_counter() - t0
+        same_rows(incremental, full)
+        print(f"{name:<20}{len(full):>10,}{t_inc:>10.3f}{t_full:>10.3f}")
+    print("incremental updates match full reshapes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--countries", type=int, default=200)
+    parser.add_argument("--waves", type=int, default=10)
+    parser.add_argument("--questions", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    raw = make_raw_sheet(args.countries, args.waves, args.questions)
+    cells = args.questions * args.countries * args.waves
+    print(f"Synthetic sheet: {args.countries} countries × {args.waves} waves × "
+          f"{args.questions} questions = {cells:,} cells")
+
+    t_old, old = best_of(lambda: reshape_long_legacy(raw), args.repeat)
+    t_new, new = best_of(lambda: reshape_long(raw), args.repeat)
+
+    # Same rows, same labels, same order (the compact schema drops "col")
+    as_plain = new.astype({"Domain": str, "Question": str, "Country": str})
+    pd.testing.assert_frame_equal(
+        old.drop(columns="col").reset_index(drop=True)[list(new.columns)],
+        as_plain, check_dtype=False, rtol=1e-6
+    )
+
+    mb_old, mb_new = memory_footprint(old) / 1e6, memory_footprint(new) / 1e6
+    print(f"{'implementation':<16}{'seconds':>10}{'memory MB':>12}{'bytes/row':>12}")
+    print(f"{'legacy (melt)':<16}{t_old:>10.3f}{mb_old:>12.1f}{mb_old * 1e6 / len(old):>12.1f}")
+    print(f"{'per-column':<16}{t_new:>10.3f}{mb_new:>12.1f}{mb_new * 1e6 / len(new):>12.1f}")
+    print(f"speedup: {t_old / t_new:.1f}x, memory: {mb_old / mb_new:.1f}x smaller")
+
+    check_incremental(raw)
+
+
+if __name__ == "__main__":
+    main()
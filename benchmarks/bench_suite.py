@@ -0,0 +1,165 @@
+"""End-to-end benchmark on synthetic Results-style workbooks of several sizes.
+
+Times each stage of serving a view (workbook load and reshape, snapshot read,
+index build, filtering, chart specs, exports) and its peak Python memory,
+without starting Streamlit. Run from the repository root:
+
+    python -m benchmarks.bench_suite [--sizes small medium large] [--csv results.csv]
+
+Peak memory is what tracemalloc sees (Python and NumPy allocations; Arrow
+buffers are not included). With --csv the rows are appended, with a timestamp
+and label, so runs of different releases can be compared.
+"""
+import argparse
+import csv
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+
+from benchmarks.synthetic import make_raw_sheet, write_workbook
+from charts import COUNTRY_PANELS, SINGLE_FIGURE, build_panel_charts, chart_to_spec
+from data_index import FilterIndex
+from data_loader import load_long_data_cached, read_long_data, read_snapshot, snapshot_path
+from exports import export_bytes
+
+# Name -> (countries, waves, questions)
+SIZES = {
+    "small": (20, 5, 100),
+    "medium": (60, 8, 300),
+    "large": (150, 10, 600),
+    "xlarge": (250, 12, 1000),
+}
+
+COLUMNS = ["size", "cells", "stage", "ms", "peak_mb", "detail"]
+
+
+def measure(fn, repeat: int):
+    """Best wall time of `repeat` untraced calls, then peak traced memory of one more call."""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    try:
+        result = fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak, result
+
+
+def random_selections(index: FilterIndex, n: int, seed: int = 0) -> list:
+    """(domain, questions, countries, year_range) picks resembling sidebar use."""
+    rng = np.random.default_rng(seed)
+    picks = []
+    for _ in range(n):
+        domain = index.domains[rng.integers(len(index.domains))]
+        opts = index.options[domain]
+        questions = list(rng.choice(opts["questions"], size=min(3, len(opts["questions"])), replace=False))
+        countries = list(opts["countries"])
+        if rng.random() < 0.5:
+            countries = list(rng.choice(countries, size=max(1, len(countries) // 4), replace=False))
+        years = opts["years"]
+        picks.append((domain, questions, countries, (years[0], years[-1])))
+    return picks
+
+
+def run_size(name: str, folder: str, repeat: int, n_filters: int) -> list:
+    n_countries, n_waves, n_questions = SIZES[name]
+    cells = n_countries * n_waves * n_questions
+    path = os.path.join(folder, f"{name}.xlsx")
+    write_workbook(path, make_raw_sheet(n_countries, n_waves, n_questions))
+    rows = []
+
+    def record(stage, seconds, peak, detail=""):
+        rows.append({
+            "size": name, "cells": cells, "stage": stage, "ms": round(seconds * 1000, 2),
+            "peak_mb": round(peak / 1e6, 2), "detail": detail,
+        })
+
+    t, peak, long_df = measure(lambda: read_long_data(path), repeat)
+    record("load_xlsx", t, peak, f"{len(long_df):,} rows")
+
+    # Writes the Parquet snapshot once, then times reading it back
+    load_long_data_cached(path)
+    snap = snapshot_path(path)
+    t, peak, _ = measure(lambda: read_snapshot(snap), repeat)
+    record("load_snapshot", t, peak, f"{os.path.getsize(snap) / 1e6:.1f} MB file")
+
+    t, peak, index = measure(lambda: FilterIndex(long_df), repeat)
+    record("build_index", t, peak, f"{len(index.domains)} domains")
+
+    picks = random_selections(index, n_filters)
+    t, peak, _ = measure(lambda: [index.filter(*p) for p in picks], repeat)
+    record("filter", t / len(picks), peak, f"per call, {len(picks)} selections")
+
+    domain, questions, countries, year_range = picks[0]
+    countries = index.options[domain]["countries"]
+    for layout in (SINGLE_FIGURE, COUNTRY_PANELS):
+        by = "Country" if layout == COUNTRY_PANELS else "Question"
+        plot_df = index.filter(domain, questions, countries, year_range, by)
+
+        def specs():
+            charts = build_panel_charts(
+                plot_df, domain, questions, countries, "Line Chart", layout,
+                "Colorblind-safe (default)", "Academic (light)"
+            )
+            return [chart_to_spec(chart) for _, chart in charts]
+
+        t, peak, out = measure(specs, repeat)
+        record(f"chart_specs[{'panels' if by == 'Country' else 'single'}]", t, peak,
+               f"{len(out)} panel(s), {len(plot_df):,} points")
+
+    export_df = index.filter(domain, index.options[domain]["questions"], countries, year_range)
+    for fmt in ("csv", "xlsx", "parquet"):
+        t, peak, data = measure(lambda: export_bytes(export_df, fmt), repeat)
+        record(f"export_{fmt}", t, peak, f"{len(export_df):,} rows, {len(data) / 1e6:.2f} MB")
+
+    return rows
+
+
+def print_table(rows: list) -> None:
+    print(f"{'size':<8}{'cells':>11}  {'stage':<22}{'ms':>11}{'peak MB':>10}  detail")
+    for r in rows:
+        print(f"{r['size']:<8}{r['cells']:>11,}  {r['stage']:<22}{r['ms']:>11,.2f}{r['peak_mb']:>10,.2f}  {r['detail']}")
+
+
+def append_csv(path: str, rows: list, label: str) -> None:
+    stamp = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    new = not os.path.exists(path)
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["time", "label", "python"] + COLUMNS)
+        if new:
+            writer.writeheader()
+        for r in rows:
+            writer.writerow({"time": stamp, "label": label, "python": platform.python_version(), **r})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", default=["small", "medium"], choices=list(SIZES))
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per stage (best is reported)")
+    parser.add_argument("--filters", type=int, default=50, help="Random selections for the filter stage")
+    parser.add_argument("--csv", help="Append results to this CSV file")
+    parser.add_argument("--label", default="", help="Run label stored in the CSV (e.g. a release tag)")
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as folder:
+        for name in args.sizes:
+            rows += run_size(name, folder, args.repeat, args.filters)
+
+    print_table(rows)
+    if args.csv:
+        append_csv(args.csv, rows, args.label)
+        print(f"Appended {len(rows)} row(s) to {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
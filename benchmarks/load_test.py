@@ -0,0 +1,224 @@
+"""Load test: many simulated dashboard sessions replaying a visit through AppTest.
+
+Each session is a Streamlit AppTest of RTool.py that replays a scripted visit
+(change domain, Select All, switch layout, change theme) and every rerun is
+timed. Only the public AppTest API is used, so its limits apply: AppTest is
+not thread-safe, so the sessions of one process take turns, one step each,
+while sharing the process's caches as the sessions of one server do.
+--processes runs several such groups in parallel, like server replicas with
+their own caches. Downloads run outside script reruns and are not replayed
+here (benchmarks.bench_suite times the exports). Run from the repository
+root, fully offline:
+
+    python -m benchmarks.load_test [--sessions 8] [--processes 2] [--rounds 3] [--synthetic medium]
+
+Without --synthetic the bundled Results.xlsx is used. Charts are cached in a
+temporary folder, so the first visits start cold. Reports p50/p95 latency
+per step, steps per second and the resident memory of the processes.
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from streamlit.testing.v1 import AppTest
+
+from benchmarks.bench_suite import SIZES
+from benchmarks.synthetic import make_raw_sheet, write_workbook
+from diagnostics import resident_memory
+
+APP_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, "RTool.py"))
+
+# Seconds a single rerun may take before the session counts it as failed
+RUN_TIMEOUT = 300
+
+
+def widget(elements, label: str):
+    return next(w for w in elements if w.label == label)
+
+
+def change_domain(at, rng):
+    box = widget(at.sidebar.selectbox, "Domain")
+    others = [d for d in box.options if d != box.value] or box.options
+    box.set_value(rng.choice(others)).run()
+
+
+def select_all(at, rng):
+    widget(at.sidebar.button, "Select All").click().run()
+
+
+def switch_layout(at, rng):
+    radio = widget(at.sidebar.radio, "Plot layout")
+    radio.set_value(rng.choice([o for o in radio.options if o != radio.value])).run()
+
+
+def change_theme(at, rng):
+    box = widget(at.sidebar.selectbox, "Theme preset")
+    box.set_value(rng.choice([o for o in box.options if o != box.value])).run()
+
+
+STEPS = [
+    ("change_domain", change_domain),
+    ("select_all", select_all),
+    ("switch_layout", switch_layout),
+    ("change_theme", change_theme),
+]
+
+
+class Session:
+    """One simulated user: opens the app, then replays STEPS `rounds` times."""
+
+    def __init__(self, number: int, rounds: int, think: float):
+        self.rng = random.Random(number)
+        self.at = AppTest.from_file(APP_PATH, default_timeout=RUN_TIMEOUT)
+        self.visit = ["open"] + [name for _ in range(rounds) for name, _ in STEPS]
+        self.actions = dict(STEPS, open=lambda at, rng: at.run())
+        self.think = think
+        self.next_at = 0.0
+        self.timings = []  # (step, seconds)
+        self.errors = []
+
+    @property
+    def done(self) -> bool:
+        return not self.visit
+
+    def step(self) -> None:
+        name = self.visit.pop(0)
+        t0 = time.perf_counter()
+        try:
+            self.actions[name](self.at, self.rng)
+        except Exception as e:
+            self.errors.append(f"{name}: {type(e).__name__}: {e}")
+            return
+        self.timings.append((name, time.perf_counter() - t0))
+        if self.at.exception:
+            self.errors.append(f"{name}: {self.at.exception[0].message}")
+        if self.think:
+            self.next_at = time.monotonic() + self.rng.uniform(0, 2 * self.think)
+
+
+class MemorySampler(threading.Thread):
+    """Samples the resident memory of the process until stopped."""
+
+    def __init__(self, interval: float = 0.2):
+        super().__init__(name="load-memory", daemon=True)
+        self.interval = interval
+        self.samples = []
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            rss = resident_memory()
+            if rss is not None:
+                self.samples.append(rss)
+            self.stopped.wait(self.interval)
+
+
+def run_sessions(first: int, count: int, rounds: int, think: float, ramp: float) -> dict:
+    """Replays `count` sessions in this process, one step at a time in turn."""
+    # Streamlit logs a warning per rerun outside a real server
+    logging.disable(logging.WARNING)
+
+    sampler = MemorySampler()
+    rss_start = resident_memory()
+    sampler.start()
+
+    sessions, active = [], []
+    started = time.monotonic()
+    while len(sessions) < count or active:
+        # Sessions join over `ramp` seconds
+        due = started + ramp * len(sessions) / max(count - 1, 1)
+        if len(sessions) < count and (time.monotonic() >= due or not active):
+            session = Session(first + len(sessions), rounds, think)
+            sessions.append(session)
+            active.append(session)
+        ready = [s for s in active if s.next_at <= time.monotonic()]
+        if not ready:
+            time.sleep(0.01)
+            continue
+        for session in ready:
+            session.step()
+        active = [s for s in active if not s.done]
+
+    sampler.stopped.set()
+    sampler.join()
+    return {
+        "timings": [t for s in sessions for t in s.timings],
+        "errors": [e for s in sessions for e in s.errors],
+        "rss": (rss_start, max(sampler.samples, default=None), sampler.samples[-1] if sampler.samples else None),
+    }
+
+
+def print_report(results: list, wall: float) -> None:
+    timings = [t for r in results for t in r["timings"]]
+    print(f"\n{'step':<15}{'runs':>6}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for name in ["open"] + [n for n, _ in STEPS] + ["all"]:
+        values = [t for n, t in timings if name in (n, "all")]
+        if not values:
+            continue
+        ms = np.asarray(values) * 1000
+        print(f"{name:<15}{len(ms):>6}{np.percentile(ms, 50):>10.0f}{np.percentile(ms, 95):>10.0f}{ms.max():>10.0f}")
+
+    print(f"\n{len(timings)} step(s) in {wall:.1f}s: {len(timings) / wall:.2f} step(s)/s")
+    mb = 1024 * 1024
+    for i, r in enumerate(results):
+        start, peak, end = r["rss"]
+        if start is not None and peak is not None:
+            print(f"Process {i} resident memory: {start / mb:,.0f} MB before, peak {peak / mb:,.0f} MB, "
+                  f"{end / mb:,.0f} MB at the end")
+
+    errors = [e for r in results for e in r["errors"]]
+    if errors:
+        print(f"\n{len(errors)} failed step(s), e.g.:")
+        for e in errors[:5]:
+            print(f"  {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=8, help="Simulated sessions in total")
+    parser.add_argument("--processes", type=int, default=1, help="Processes the sessions are spread over")
+    parser.add_argument("--rounds", type=int, default=3, help="Times each session replays the visit")
+    parser.add_argument("--think", type=float, default=0.0, help="Mean pause between a session's steps, in seconds")
+    parser.add_argument("--ramp", type=float, default=1.0, help="Seconds over which sessions are started")
+    parser.add_argument("--synthetic", choices=list(SIZES), help="Use a synthetic workbook of this size")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        os.environ.setdefault("RTOOL_CHART_CACHE", os.path.join(folder, "charts"))
+        if args.synthetic:
+            data_dir = os.path.join(folder, "data")
+            os.makedirs(data_dir)
+            write_workbook(os.path.join(data_dir, "Results.xlsx"), make_raw_sheet(*SIZES[args.synthetic]))
+            # The app looks for Results.xlsx in the working directory
+            os.chdir(data_dir)
+        elif not os.path.exists("Results.xlsx"):
+            sys.exit("Results.xlsx not found; run from the repository root or pass --synthetic")
+
+        processes = max(1, min(args.processes, args.sessions))
+        shares = [len(part) for part in np.array_split(np.arange(args.sessions), processes)]
+        firsts = np.cumsum([0] + shares[:-1])
+
+        t0 = time.perf_counter()
+        if processes == 1:
+            results = [run_sessions(0, args.sessions, args.rounds, args.think, args.ramp)]
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                futures = [
+                    pool.submit(run_sessions, int(first), share, args.rounds, args.think, args.ramp)
+                    for first, share in zip(firsts, shares)
+                ]
+                results = [f.result() for f in futures]
+        wall = time.perf_counter() - t0
+
+        print_report(results, wall)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+
+
+def make_raw_sheet(n_countries: int, n_waves: int, n_questions: int,
+                   n_domains: int = 7, missing: float = 0.05, seed: int = 0) -> pd.DataFrame:
+    """Builds a sheet in the Results.xlsx layout, as pd.read_excel returns it.
+
+    Header row: two unnamed label columns, then "Country", "Country.1", ... per wave.
+    Row 0 holds "Domain"/"Question" and the year of every country–wave column.
+    """
+    rng = np.random.default_rng(seed)
+    countries = [f"Country{i:03d}" for i in range(n_countries)]
+    value_cols = [c if w == 0 else f"{c}.{w}" for c in countries for w in range(n_waves)]
+    years = [1981 + 4 * w + int(rng.integers(0, 3)) for _ in countries for w in range(n_waves)]
+
+    values = rng.normal(size=(n_questions, len(value_cols)))
+    values[rng.random(values.shape) < missing] = np.nan
+
+    data = pd.DataFrame(values, columns=value_cols)
+    data.insert(0, "Unnamed: 0", [f"Domain {q % n_domains}" for q in range(n_questions)])
+    data.insert(1, "Unnamed: 1", [f" Q{q:04d}" for q in range(n_questions)])
+
+    year_row = pd.DataFrame([["Domain", "Question"] + years], columns=data.columns)
+    return pd.concat([year_row, data], ignore_index=True)
+
+
+def write_workbook(path: str, raw: pd.DataFrame, sheet: str = "Sheet1") -> None:
+    """Writes a synthetic sheet so that pd.read_excel(path) returns `raw` again."""
+    raw.to_excel(path, sheet_name=sheet, index=False)
@@ -0,0 +1,369 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+import pandas as pd
+
+from data_index import FilterIndex
+from data_loader import DATASET_KEY, DATASET_SHEET, atomic_write, concat_long, is_dataset, load_sheets_cached, memory_footprint
+
+# Bump when the recorded sheet schema changes so old catalog files are ignored
+CATALOG_VERSION = "1"
+
+# Minimum seconds between checks of the workbooks' modification times
+RELOAD_CHECK_SECONDS = 2.0
+
+logger = logging.getLogger(__name__)
+
+
+# -------------------------------------------------
+# Cheap schema scan
+# -------------------------------------------------
+def _scan_sheet(ws) -> dict:
+    """Domains, countries and year range of a Results-style sheet, or None for other sheets.
+
+    Reads the header row, the year row and the first column only.
+    """
+    top = list(ws.iter_rows(min_row=1, max_row=2, values_only=True))
+    if len(top) < 2:
+        return None
+    header, year_row = top
+    if [str(v).strip() if v is not None else "" for v in year_row[:2]] != ["Domain", "Question"]:
+        return None
+
+    countries, years = set(), []
+    for name, year in zip(header[2:], year_row[2:]):
+        if name is None or year is None:
+            continue
+        countries.add(str(name).split(".")[0].strip())
+        years.append(int(year))
+
+    domains = {
+        str(row[0]).strip()
+        for row in ws.iter_rows(min_row=3, max_col=1, values_only=True)
+        if row and row[0] is not None and str(row[0]).strip()
+    }
+    if not domains or not years:
+        return None
+
+    return {
+        "sheet": ws.title,
+        "domains": sorted(domains),
+        "countries": sorted(countries),
+        "years": [min(years), max(years)],
+    }
+
+
+def _scan_dataset(path: str) -> list:
+    """Schema of a Parquet long-table dataset, read from its label and year columns."""
+    import pyarrow.parquet as pq
+
+    schema = pq.read_schema(path)
+    if DATASET_KEY not in (schema.metadata or {}):
+        return []
+    table = pq.read_table(path, columns=["Domain", "Country", "Year"]).to_pandas()
+    if table.empty:
+        return []
+    return [{
+        "sheet": DATASET_SHEET,
+        "domains": sorted(str(d) for d in table["Domain"].unique()),
+        "countries": sorted(str(c) for c in table["Country"].unique()),
+        "years": [int(table["Year"].min()), int(table["Year"].max())],
+    }]
+
+
+def _scan_workbook_file(file_input) -> list:
+    if is_dataset(file_input):
+        return _scan_dataset(os.fspath(file_input))
+
+    import openpyxl
+
+    if hasattr(file_input, "seek"):
+        file_input.seek(0)
+    wb = openpyxl.load_workbook(file_input, read_only=True, data_only=True)
+    try:
+        return [info for info in (_scan_sheet(ws) for ws in wb.worksheets) if info]
+    finally:
+        wb.close()
+
+
+def _catalog_file(path: str) -> str:
+    folder, name = os.path.split(os.path.abspath(path))
+    return os.path.join(folder, f".{os.path.splitext(name)[0]}.catalog.json")
+
+
+def scan_workbook(file_input) -> list:
+    """Schema of every data sheet in a workbook (path or file-like).
+
+    For paths the result is kept in a small JSON file next to the workbook and
+    reused while the workbook's mtime and size are unchanged.
+    """
+    if not isinstance(file_input, (str, os.PathLike)):
+        return _scan_workbook_file(file_input)
+
+    path = os.fspath(file_input)
+    stat = os.stat(path)
+    stamp = {"version": CATALOG_VERSION, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+    cache = _catalog_file(path)
+    try:
+        with open(cache, encoding="utf-8") as f:
+            saved = json.load(f)
+        if all(saved.get(k) == v for k, v in stamp.items()):
+            return saved["sheets"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    sheets = _scan_workbook_file(path)
+    try:
+        with atomic_write(cache) as tmp, open(tmp, "w", encoding="utf-8") as f:
+            json.dump({**stamp, "sheets": sheets}, f)
+    except OSError:
+        pass
+    return sheets
+
+
+def find_workbooks(folder: str = ".") -> list:
+    """All xlsx workbooks and Parquet datasets in a folder, sorted by name.
+
+    Excel lock files and hidden files (such as snapshots) are excluded; Parquet
+    files without the dataset tag are skipped when scanned.
+    """
+    return sorted(
+        os.path.join(folder, f) for f in os.listdir(folder)
+        if f.lower().endswith((".xlsx", ".parquet")) and not f.startswith(("~$", "."))
+        and os.path.isfile(os.path.join(folder, f))
+    )
+
+
+def workbook_sources(path: str) -> list:
+    """Catalog sources for a main workbook: it first, then every other workbook next to it."""
+    others = [
+        p for p in find_workbooks(os.path.dirname(os.path.abspath(path)))
+        if os.path.abspath(p) != os.path.abspath(path)
+    ]
+    return [path] + others
+
+
+# -------------------------------------------------
+# Catalog with lazy per-sheet loading
+# -------------------------------------------------
+def _merge_by_priority(frames, sources) -> pd.DataFrame:
+    """Concatenates long tables of several sources, in priority order.
+
+    A series point found in a higher-priority (lower-numbered) source drops
+    that point from every lower-priority source; the rows of each source are
+    otherwise kept as they are, including points repeated within a source.
+    """
+    if len(set(sources)) == 1:
+        return frames[0] if len(frames) == 1 else concat_long(frames)
+    df = concat_long(frames)
+    source = np.repeat(sources, [len(f) for f in frames])
+    keys = [df[c] for c in ["Domain", "Question", "Country", "Year"]]
+    first = pd.Series(source).groupby(keys, observed=True, sort=False).transform("min").to_numpy()
+    return df[source == first].reset_index(drop=True)
+
+
+def _stamp(file_input):
+    """(mtime, size) of a workbook path; None for uploads and missing files."""
+    if not isinstance(file_input, (str, os.PathLike)):
+        return None
+    try:
+        stat = os.stat(file_input)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class _CatalogState:
+    """One consistent generation of the catalog; replaced as a whole on reload."""
+
+    def __init__(self, version: int, stamps: list, sheets: list, tables: dict = None, indexes: dict = None):
+        self.version = version
+        self.stamps = stamps
+        self.sheets = sheets
+        self.domains = sorted({d for info in sheets for d in info["domains"]})
+        # (source, sheet) -> (long table, column fingerprints); replaced, never
+        # mutated, so readers can use the dict without holding the lock
+        self.tables = tables or {}
+        # domain -> FilterIndex (replaced the same way)
+        self.indexes = indexes or {}
+        # (source, sheet) -> Future of a load in progress
+        self.loading = {}
+
+
+class DatasetCatalog:
+    """Domains available across workbooks and sheets; sheet data is loaded on first use.
+
+    `sources` are workbook paths (or uploaded files) in priority order: when
+    the same series point appears in several sources, the first source wins.
+
+    `refresh()` notices workbooks that changed on disk and reloads them on a
+    background thread, melting only changed country–wave columns of the sheets
+    already loaded. The new generation is swapped in at once; until then every
+    session keeps reading the previous one.
+    """
+
+    def __init__(self, sources):
+        self.sources = list(sources)
+        self._lock = threading.Lock()
+        self._reloading = False
+        self._failed_stamps = None
+        self._last_check = time.monotonic()
+        stamps = [_stamp(s) for s in self.sources]
+        self._state = _CatalogState(0, stamps, self._scan(stamps))
+
+    def _scan(self, stamps: list, previous: _CatalogState = None) -> list:
+        sheets = []
+        for i, source in enumerate(self.sources):
+            if previous is not None and previous.stamps[i] == stamps[i]:
+                sheets += [info for info in previous.sheets if info["source"] == i]
+            else:
+                sheets += [{**info, "source": i} for info in scan_workbook(source)]
+        return sheets
+
+    @property
+    def version(self) -> int:
+        """Generation number; changes whenever reloaded data is swapped in."""
+        return self._state.version
+
+    @property
+    def sheets(self) -> list:
+        return self._state.sheets
+
+    @property
+    def domains(self) -> list:
+        return self._state.domains
+
+    @property
+    def reloading(self) -> bool:
+        return self._reloading
+
+    def sheets_for(self, domain: str) -> list:
+        return [info for info in self._state.sheets if domain in info["domains"]]
+
+    def _load_sheets(self, state: _CatalogState, keys: list) -> list:
+        """Long tables of (source, sheet) keys; sheets not loaded yet are parsed together.
+
+        The lock is only held to claim and publish sheets, never while parsing:
+        other sessions keep running, and those needing a sheet that is being
+        loaded wait for that load instead of starting their own.
+        """
+        with self._lock:
+            missing = [key for key in keys if key not in state.tables and key not in state.loading]
+            for key in missing:
+                state.loading[key] = Future()
+            pending = {key: state.loading[key] for key in keys if key not in state.tables}
+
+        if missing:
+            try:
+                loaded = load_sheets_cached([(self.sources[source], sheet) for source, sheet in missing])
+            except BaseException as e:
+                with self._lock:
+                    for key in missing:
+                        state.loading.pop(key).set_exception(e)
+                raise
+            with self._lock:
+                state.tables = {**state.tables, **dict(zip(missing, loaded))}
+                for key in missing:
+                    state.loading.pop(key).set_result(state.tables[key])
+
+        tables = state.tables
+        return [(tables[key] if key in tables else pending[key].result())[0] for key in keys]
+
+    def _domain_index(self, state: _CatalogState, domain: str) -> FilterIndex:
+        index = state.indexes.get(domain)
+        if index is not None:
+            return index
+        if domain not in state.domains:
+            raise KeyError(f"Unknown domain: {domain}")
+
+        keys = [(info["source"], info["sheet"]) for info in state.sheets if domain in info["domains"]]
+        frames = [table[table["Domain"] == domain] for table in self._load_sheets(state, keys)]
+        index = FilterIndex(_merge_by_priority(frames, [source for source, _ in keys]))
+
+        with self._lock:
+            if domain not in state.indexes:
+                state.indexes = {**state.indexes, domain: index}
+            return state.indexes[domain]
+
+    def load_sheet(self, source: int, sheet: str) -> pd.DataFrame:
+        """Long table of one sheet, loaded (or read from its snapshot) once."""
+        return self._load_sheets(self._state, [(source, sheet)])[0]
+
+    def domain_index(self, domain: str) -> FilterIndex:
+        """Filter index over every sheet that holds `domain`."""
+        return self._domain_index(self._state, domain)
+
+    def refresh(self, min_interval: float = RELOAD_CHECK_SECONDS) -> bool:
+        """Starts a background reload if a workbook changed; True when one was started.
+
+        Checks file stamps at most every `min_interval` seconds. After a failed
+        reload (e.g. a workbook deleted or saved half-way), the same file
+        stamps are not retried; the workbooks have to change again.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._reloading or now - self._last_check < min_interval:
+                return False
+            self._last_check = now
+        stamps = [_stamp(s) for s in self.sources]
+        with self._lock:
+            if self._reloading or stamps in (self._state.stamps, self._failed_stamps):
+                return False
+            self._reloading = True
+        threading.Thread(target=self._reload, args=(stamps,), daemon=True).start()
+        return True
+
+    def _reload(self, stamps: list) -> None:
+        try:
+            old = self._state
+            tables, indexes = old.tables, old.indexes
+            changed = {i for i, stamp in enumerate(stamps) if stamp != old.stamps[i]}
+
+            sheets = self._scan(stamps, old)
+            present = {(info["source"], info["sheet"]) for info in sheets}
+            new_tables = {key: t for key, t in tables.items() if key in present and key[0] not in changed}
+            stale = [key for key in tables if key in present and key[0] in changed]
+            reloaded = load_sheets_cached([(self.sources[s], sheet, tables[(s, sheet)]) for s, sheet in stale])
+            new_tables.update(zip(stale, reloaded))
+
+            state = _CatalogState(old.version + 1, stamps, sheets, new_tables)
+
+            # Domains untouched by the changed workbooks keep their index;
+            # the others that were in use are rebuilt before the swap
+            touched = {
+                d for info in old.sheets + sheets if info["source"] in changed
+                for d in info["domains"]
+            }
+            for domain, index in indexes.items():
+                if domain not in state.domains:
+                    continue
+                if domain in touched:
+                    self._domain_index(state, domain)
+                else:
+                    state.indexes = {**state.indexes, domain: index}
+
+            with self._lock:
+                self._state = state
+                self._failed_stamps = None
+        except Exception:
+            # The current generation stays in use
+            logger.exception("Reloading changed workbooks failed; keeping the loaded data")
+            self._failed_stamps = stamps
+        finally:
+            self._reloading = False
+
+    def loaded_rows(self) -> int:
+        return sum(len(t) for t, _ in self._state.tables.values())
+
+    def memory_footprint(self) -> int:
+        """Bytes held by loaded sheet tables, domain indexes and their statistics."""
+        state = self._state
+        tables, indexes = state.tables, state.indexes
+        frames = [t for t, _ in tables.values()] + [i.df for i in indexes.values()]
+        cubes = [i.stats.nbytes for i in indexes.values()]
+        return sum(memory_footprint(f) for f in frames) + sum(cubes)
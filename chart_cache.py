@@ -0,0 +1,158 @@
+"""On-disk, content-addressed cache of rendered chart assets.
+
+A panel's asset key hashes the view parameters, the panel number, the
+content of the panel's frame and the chart-building code, so an asset stays
+valid for as long as the data and charts.py are unchanged; reloaded data or
+edited chart code simply get new keys. Vega-Lite specs are stored as JSON,
+optional static renderings (SVG/PNG, via vl-convert) next to them. The app
+reads specs from here before building a chart; only the warm-up writes, so
+the folder holds the default views and stays bounded.
+
+Warm the cache for every domain's default view without starting Streamlit:
+
+    python chart_cache.py [--data Results.xlsx] [--formats svg png]
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from functools import lru_cache
+from importlib.metadata import version
+
+import pandas as pd
+
+from data_loader import atomic_write
+
+# Bump when the stored asset format changes (chart code changes are hashed)
+CHART_CACHE_VERSION = "2"
+
+# Cache folder (RTOOL_CHART_CACHE overrides it)
+CHART_CACHE_ENV = "RTOOL_CHART_CACHE"
+DEFAULT_CHART_CACHE_DIR = ".rtool_chart_cache"
+
+# Oldest assets beyond this many files are removed after a warm-up
+CHART_CACHE_MAX_FILES = 2000
+
+
+def cache_dir() -> str:
+    return os.environ.get(CHART_CACHE_ENV, DEFAULT_CHART_CACHE_DIR)
+
+
+def frame_digest(frame: pd.DataFrame) -> str:
+    """Content hash of a panel frame (values and column names)."""
+    h = hashlib.sha256(",".join(map(str, frame.columns)).encode())
+    h.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def _altair_version() -> str:
+    # Read from the package metadata, so that cache hits never import altair
+    return version("altair")
+
+
+@lru_cache(maxsize=None)
+def _chart_code_digest() -> str:
+    # Specs depend on the styles and encodings in charts.py
+    import charts
+
+    with open(charts.__file__, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def asset_key(view_key, panel: int, frame: pd.DataFrame) -> str:
+    payload = json.dumps(
+        [CHART_CACHE_VERSION, _altair_version(), _chart_code_digest(), view_key, panel, frame_digest(frame)],
+        default=str
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def asset_path(key: str, ext: str = "json") -> str:
+    return os.path.join(cache_dir(), key[:2], f"{key}.{ext}")
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with atomic_write(path) as tmp, open(tmp, "wb") as f:
+        f.write(data)
+
+
+def load_spec(key: str) -> dict:
+    """Stored Vega-Lite spec, or None."""
+    try:
+        with open(asset_path(key), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def store_spec(key: str, spec: dict) -> None:
+    """Stores a spec; failures (e.g. a read-only folder) only cost the cache."""
+    try:
+        _write_atomic(asset_path(key), json.dumps(spec).encode("utf-8"))
+    except OSError:
+        pass
+
+
+def store_static(key: str, spec: dict, frame: pd.DataFrame, formats) -> list:
+    """Renders a spec with its frame to SVG/PNG next to the spec; returns the written paths."""
+    import vl_convert as vlc
+
+    full = {**spec, "data": {"values": json.loads(frame.to_json(orient="records"))}}
+    written = []
+    for fmt in formats:
+        path = asset_path(key, fmt)
+        if os.path.exists(path):
+            continue
+        if fmt == "svg":
+            data = vlc.vegalite_to_svg(full).encode("utf-8")
+        else:
+            data = vlc.vegalite_to_png(full)
+        _write_atomic(path, data)
+        written.append(path)
+    return written
+
+
+def prune(max_files: int = CHART_CACHE_MAX_FILES) -> int:
+    """Removes the least recently written assets beyond `max_files`; returns how many."""
+    folder = cache_dir()
+    if not os.path.isdir(folder):
+        return 0
+    files = [
+        os.path.join(root, f) for root, _, names in os.walk(folder)
+        for f in names if not f.endswith(".tmp")
+    ]
+    if len(files) <= max_files:
+        return 0
+    files.sort(key=lambda p: os.stat(p).st_mtime)
+    removed = 0
+    for path in files[:len(files) - max_files]:
+        try:
+            os.remove(path)
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+def main():
+    from catalog import DatasetCatalog, workbook_sources
+    from rendering import warm_up
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data", default="Results.xlsx", help="Main workbook; others in its folder are included")
+    parser.add_argument("--formats", nargs="*", default=[], choices=["svg", "png"],
+                        help="Static renderings to store as well (needs vl-convert-python)")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    catalog = DatasetCatalog(workbook_sources(args.data))
+    # Offline, every domain is warmed, parsing workbooks as needed
+    panels = warm_up(catalog, args.formats, domains=catalog.domains)
+    print(f"Warmed {panels} panel(s) into {cache_dir()} in {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,432 @@
+import threading
+from functools import partial
+
+import pandas as pd
+
+from diagnostics import timed
+
+# Layout options offered in the sidebar
+SINGLE_FIGURE = "Single figure (all countries)"
+COUNTRY_PANELS = "Country panels"
+
+# Panel size; facet panels need a fixed width, so a grid row spans about PANEL_ROW_WIDTH
+PANEL_HEIGHT = 450
+PANEL_ROW_WIDTH = 1100
+
+# Points per chart above which only the top series are drawn, the rest averaged
+MAX_CHART_POINTS = 5000
+
+# Series label of the averaged remainder
+OTHERS_LABEL = "Others (mean)"
+
+# Altair's theme and data-transformer settings are process-global
+_altair_lock = threading.Lock()
+
+# altair is imported where charts are built, not at startup: planning panels
+# and serving specs from the chart cache do not need it
+
+
+# -------------------------------------------------
+# Style helpers
+# -------------------------------------------------
+def get_country_color_encoding(graph_style: str, focal_country=None):
+    """Color mapping for countries, depending on graph style."""
+    import altair as alt
+
+    if graph_style == "Colorblind-safe (default)":
+        palette = [
+            "#1b9e77", "#d95f02", "#7570b3", "#e7298a",
+            "#66a61e", "#e6ab02", "#a6761d", "#666666"
+        ]
+        return alt.Color(
+            "Country:N",
+            title="Country",
+            scale=alt.Scale(range=palette)
+        )
+
+    if graph_style == "Monochrome (blue shades)":
+        return alt.Color(
+            "Country:N",
+            title="Country",
+            scale=alt.Scale(scheme="blues")
+        )
+
+    if graph_style == "Highlight focal country" and focal_country is not None:
+        return alt.condition(
+            alt.datum.Country == focal_country,
+            alt.value("#1f77b4"),   # highlight
+            alt.value("#CCCCCC")    # others
+        )
+
+    return alt.value("black")
+
+
+def get_stroke_dash_encoding(graph_style: str, countries):
+    """Line style mapping (used for black & white)."""
+    import altair as alt
+
+    if graph_style == "Black & white (line styles)":
+        return alt.StrokeDash(
+            "Country:N",
+            title="Country",
+            sort=list(countries)
+        )
+    return alt.value([1, 0])
+
+
+def style_chart(chart: "alt.Chart", theme: str) -> "alt.Chart":
+    """Apply theme preset: fonts, fill, grid, legend, etc."""
+    chart = chart.configure_axis(
+        labelFontSize=13,
+        titleFontSize=15
+    ).configure_legend(
+        titleFontSize=14,
+        labelFontSize=12
+    ).configure_title(
+        fontSize=18,
+        anchor="start"
+    ).configure_header(
+        labelFontSize=18,
+        labelAnchor="start"
+    )
+
+    if theme == "Academic (light)":
+        chart = chart.configure_view(strokeWidth=0, fill="white").configure_axis(grid=True, gridColor="#DDDDDD")
+    elif theme == "OECD grey":
+        chart = chart.configure_view(stroke="#CCCCCC", strokeWidth=1, fill="white").configure_axis(grid=True, gridColor="#E0E0E0")
+    elif theme == "Dark dashboard":
+        chart = chart.configure_view(strokeWidth=0, fill="#111111").configure_axis(
+            labelColor="white", titleColor="white", grid=True, gridColor="#333333"
+        ).configure_legend(titleColor="white", labelColor="white").configure_title(color="white").configure_header(labelColor="white")
+    elif theme == "Pastel report":
+        chart = chart.configure_view(strokeWidth=0, fill="#FAFAFA").configure_axis(grid=True, gridColor="#F0F0F0")
+    elif theme == "The Economist":
+        # Economist style: Blue-gray background, horizontal grid only usually, but we keep grid simple
+        chart = chart.configure_view(strokeWidth=0, fill="#d5e4eb").configure_axis(
+            grid=True, gridColor="white", labelFont="Verdana", titleFont="Verdana"
+        ).configure_title(font="Verdana", fontSize=20).configure_legend(labelFont="Verdana", titleFont="Verdana").configure_header(labelFont="Verdana")
+    elif theme == "Financial Times":
+        # FT style: Salmon/Pinkish background
+        chart = chart.configure_view(strokeWidth=0, fill="#fff1e0").configure_axis(
+            grid=True, gridColor="#e3cbb0", labelFont="Georgia", titleFont="Georgia"
+        ).configure_title(font="Georgia", fontSize=20).configure_legend(labelFont="Georgia", titleFont="Georgia").configure_header(labelFont="Georgia")
+
+    return chart
+
+
+# -------------------------------------------------
+# Plotting logic
+# -------------------------------------------------
+def _encoded_mark(data, chart_type: str, x_axis_title, y_axis_title, color_enc, dash_enc, x_off) -> "alt.Chart":
+    import altair as alt
+
+    base = alt.Chart(data)
+    if chart_type == "Bar Chart":
+        mark = base.mark_bar()
+    else:
+        mark = base.mark_line(point=True)
+
+    banded = "low" in data.columns
+    chart = mark.encode(
+        x=alt.X("Year:O", title=x_axis_title),
+        y=alt.Y("value:Q", title=y_axis_title),
+        color=color_enc,
+        strokeDash=dash_enc,
+        xOffset=x_off,
+        tooltip=["Country", "Year", "Question", "value"] + (["low", "high"] if banded else [])
+    )
+    if not banded:
+        return chart
+
+    # Min–max range of the series averaged into OTHERS_LABEL
+    band = base.transform_filter("isValid(datum.low)")
+    if chart_type == "Bar Chart":
+        band = band.mark_rule(strokeWidth=2).encode(xOffset=x_off)
+    else:
+        band = band.mark_area(opacity=0.15)
+    band = band.encode(
+        x=alt.X("Year:O", title=x_axis_title),
+        y=alt.Y("low:Q", title=y_axis_title),
+        y2="high:Q",
+        color=color_enc
+    )
+    return alt.layer(band, chart)
+
+
+def create_single_chart(data, title_text, chart_type: str, theme: str, x_axis_title="Year", y_axis_title="Value", color_enc=None, dash_enc=None, x_off=None):
+    with timed("build_chart", panel=str(title_text)):
+        chart = _encoded_mark(
+            data, chart_type, x_axis_title, y_axis_title, color_enc, dash_enc, x_off
+        ).properties(
+            title=title_text,
+            height=PANEL_HEIGHT # Fixed height, width will be responsive
+        )
+    with timed("style_chart"):
+        return style_chart(chart, theme)
+
+
+def create_faceted_chart(data, facet_field: str, facet_order, columns: int, chart_type: str, theme: str, y_axis_title="Value", color_enc=None, dash_enc=None, x_off=None):
+    """One chart with a panel per `facet_field` value, sharing a single dataset."""
+    import altair as alt
+
+    with timed("build_chart", panel=f"facet by {facet_field}"):
+        chart = _encoded_mark(
+            data, chart_type, "Year", y_axis_title, color_enc, dash_enc, x_off
+        ).properties(
+            width=max(PANEL_ROW_WIDTH // columns - 60, 120),
+            height=PANEL_HEIGHT
+        ).facet(
+            facet=alt.Facet(f"{facet_field}:N", sort=list(facet_order), title=None),
+            columns=columns
+        ).resolve_scale(
+            # Each panel keeps its own axes, as separate charts would
+            x="independent",
+            y="independent"
+        )
+    with timed("style_chart"):
+        return style_chart(chart, theme)
+
+
+def _figure_encodings(chart_type: str, graph_style: str, focal_country, countries) -> tuple:
+    """(color, strokeDash, xOffset) encodings of single-figure charts."""
+    import altair as alt
+
+    color_enc = get_country_color_encoding(graph_style, focal_country)
+    dash_enc = get_stroke_dash_encoding(graph_style, countries) if chart_type == "Line Chart" else alt.value([0, 0])
+    x_off = "Country:N" if chart_type == "Bar Chart" else alt.value(0)
+    return color_enc, dash_enc, x_off
+
+
+def _country_panel_encodings(chart_type: str, graph_style: str) -> tuple:
+    """(color, strokeDash, xOffset) encodings of country panels, one series per indicator."""
+    import altair as alt
+
+    if graph_style == "Black & white (line styles)":
+        color_enc = alt.value("black")
+        dash_enc = alt.StrokeDash("Question:N", title="Indicator")
+    else:
+        color_enc = alt.Color("Question:N", title="Indicator")
+        dash_enc = alt.value([1, 0])
+    if chart_type != "Line Chart":
+        dash_enc = alt.value([0, 0])
+    x_off = "Question:N" if chart_type == "Bar Chart" else alt.value(0)
+    return color_enc, dash_enc, x_off
+
+
+def _build_encoded(create, encodings, *args, **kwargs):
+    """Calls a chart constructor with the encodings returned by `encodings()`."""
+    color_enc, dash_enc, x_off = encodings()
+    return create(*args, color_enc=color_enc, dash_enc=dash_enc, x_off=x_off, **kwargs)
+
+
+def panel_frames(plot_df: pd.DataFrame, key: str) -> dict:
+    """{value: rows of plot_df with that `key` value}.
+
+    Contiguous groups (as returned by FilterIndex.filter with by=key) are
+    plain slices, which share plot_df's memory instead of copying it.
+    """
+    frames = {}
+    for value, pos in plot_df.groupby(key, observed=True, sort=False).indices.items():
+        if pos[-1] - pos[0] + 1 == len(pos):
+            frames[value] = plot_df.iloc[pos[0]:pos[-1] + 1]
+        else:
+            frames[value] = plot_df.iloc[pos]
+    return frames
+
+
+# -------------------------------------------------
+# Point budget
+# -------------------------------------------------
+def series_limit(frame: pd.DataFrame, field: str, max_points: int) -> int:
+    """How many `field` series of a chart fit in `max_points`, next to the averaged remainder."""
+    n_series = frame[field].nunique()
+    if len(frame) <= max_points or n_series <= 1:
+        return n_series
+    other = "Question" if field == "Country" else "Country"
+    others_rows = frame.groupby([other, "Year"], observed=True).ngroups
+    per_series = len(frame) / n_series
+    return max(1, int((max_points - others_rows) // per_series))
+
+
+def top_series(frame: pd.DataFrame, field: str, order=None, keep=()) -> list:
+    """Series of `field`, `keep` first, then in `order` or by mean value (highest first)."""
+    if order is None:
+        order = frame.groupby(field, observed=True)["value"].mean().sort_values(ascending=False).index
+    present = set(frame[field].unique())
+    ranked = [s for s in keep if s in present]
+    return ranked + [s for s in order if s in present and s not in ranked]
+
+
+def collapse_series(frame: pd.DataFrame, field: str, kept) -> pd.DataFrame:
+    """Rows of the `kept` series of `field`, plus the others averaged into one OTHERS_LABEL series.
+
+    The averaged rows carry the min and max of the series they replace in "low" and "high".
+    """
+    mask = frame[field].isin(kept).to_numpy()
+    if mask.all():
+        return frame
+
+    by = [c for c in ["Domain", "Question", "Country"] if c != field] + ["Year"]
+    others = frame[~mask].groupby(by, observed=True)["value"].agg(
+        value="mean", low="min", high="max"
+    ).reset_index()
+    categories = list(frame[field].cat.categories) + [OTHERS_LABEL]
+    others[field] = pd.Categorical([OTHERS_LABEL] * len(others), categories=categories)
+
+    top = frame[mask].assign(**{field: frame[field][mask].cat.set_categories(categories)})
+    out = pd.concat([top, others[list(frame.columns) + ["low", "high"]]], ignore_index=True)
+    return out.astype({"value": "float32", "low": "float32", "high": "float32"})
+
+
+def plan_panel_charts(plot_df: pd.DataFrame, domain: str, questions, countries,
+                      chart_type: str, layout: str, graph_style: str, theme: str,
+                      focal_country=None, facet_columns=None, max_points=None) -> list:
+    """(frame, build) for every panel of the selected layout, in display order.
+
+    `build()` returns the panel's chart, so callers can build panels lazily or
+    on worker threads; frames are final (already filtered and reduced).
+
+    With `facet_columns`, multi-panel layouts are returned as a single faceted
+    chart over `plot_df` instead, laid out in that many columns.
+
+    With `max_points`, a chart that would hold more points keeps only its top
+    series. Countries beyond those (by mean value) are averaged into an
+    OTHERS_LABEL series with a min–max band; indicators in country panels are
+    on different scales, so those beyond the first ones in selection order
+    are left out instead.
+    """
+    panels = []
+
+    if layout == SINGLE_FIGURE:
+        if max_points:
+            # One set of countries for every panel, sized for the largest chart
+            if len(questions) > 1 and not facet_columns:
+                largest = max(panel_frames(plot_df, "Question").values(), key=len)
+            else:
+                largest = plot_df
+            limit = series_limit(largest, "Country", max_points)
+            kept = top_series(plot_df, "Country", keep=[focal_country])[:limit]
+            plot_df = collapse_series(plot_df, "Country", kept)
+
+        encodings = partial(_figure_encodings, chart_type, graph_style, focal_country, countries)
+
+        if len(questions) > 1 and facet_columns:
+            # Multiple indicators -> One faceted chart, one panel per indicator
+            build = partial(
+                _build_encoded,
+                create_faceted_chart,
+                encodings,
+                plot_df,
+                facet_field="Question",
+                facet_order=questions,
+                columns=facet_columns,
+                chart_type=chart_type,
+                theme=theme
+            )
+            panels.append((plot_df, build))
+        elif len(questions) > 1:
+            # Multiple indicators -> Grid of charts, one per indicator
+            by_question = panel_frames(plot_df, "Question")
+            for q in questions:
+                q_data = by_question.get(q, plot_df.iloc[:0])
+                build = partial(
+                    _build_encoded,
+                    create_single_chart,
+                    encodings,
+                    q_data,
+                    title_text=f"{q}",
+                    chart_type=chart_type,
+                    theme=theme,
+                    y_axis_title="Value"
+                )
+                panels.append((q_data, build))
+        else:
+            # One indicator -> Single chart
+            build = partial(
+                _build_encoded,
+                create_single_chart,
+                encodings,
+                plot_df,
+                title_text=f"{questions[0]} – {domain}",
+                chart_type=chart_type,
+                theme=theme,
+                y_axis_title=questions[0]
+            )
+            panels.append((plot_df, build))
+
+    else:
+        # Country panels -> Grid of charts, one per country
+        encodings = partial(_country_panel_encodings, chart_type, graph_style)
+
+        if facet_columns:
+            # One faceted chart, one panel per country
+            if max_points:
+                limit = series_limit(plot_df, "Country", max_points)
+                kept = top_series(plot_df, "Country", keep=[focal_country])[:limit]
+                plot_df = collapse_series(plot_df, "Country", kept)
+                countries = [c for c in countries if c in kept] + [OTHERS_LABEL]
+            build = partial(
+                _build_encoded,
+                create_faceted_chart,
+                encodings,
+                plot_df,
+                facet_field="Country",
+                facet_order=countries,
+                columns=facet_columns,
+                chart_type=chart_type,
+                theme=theme
+            )
+            return [(plot_df, build)]
+
+        by_country = panel_frames(plot_df, "Country")
+        kept = None
+        if max_points and by_country:
+            largest = max(by_country.values(), key=len)
+            kept = top_series(plot_df, "Question", order=questions)[:series_limit(largest, "Question", max_points)]
+        for country in countries:
+            c_data = by_country.get(country)
+            if c_data is None or c_data.empty:
+                continue
+            if kept is not None:
+                # Averaging indicators on different scales means nothing: drop the rest
+                c_data = c_data[c_data["Question"].isin(kept).to_numpy()]
+                if c_data.empty:
+                    continue
+
+            build = partial(
+                _build_encoded,
+                create_single_chart,
+                encodings,
+                c_data,
+                title_text=f"{country}",
+                chart_type=chart_type,
+                theme=theme,
+                y_axis_title="Value"
+            )
+            panels.append((c_data, build))
+
+    return panels
+
+
+def build_panel_charts(plot_df: pd.DataFrame, domain: str, questions, countries,
+                       chart_type: str, layout: str, graph_style: str, theme: str,
+                       focal_country=None, facet_columns=None, max_points=None) -> list:
+    """(frame, chart) for every panel of the selected layout, in display order."""
+    return [
+        (frame, build()) for frame, build in plan_panel_charts(
+            plot_df, domain, questions, countries, chart_type, layout, graph_style, theme,
+            focal_country, facet_columns, max_points
+        )
+    ]
+
+
+def chart_to_spec(chart: "alt.Chart") -> dict:
+    """Data-free Vega-Lite spec of a chart; its frame is passed to the renderer separately."""
+    import altair as alt
+
+    with timed("serialize_spec"), _altair_lock:
+        with alt.theme.enable("none"), alt.data_transformers.disable_max_rows():
+            spec = chart.to_dict()
+    spec.pop("data", None)
+    spec.pop("datasets", None)
+    return spec
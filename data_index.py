@@ -0,0 +1,194 @@
+import numpy as np
+import pandas as pd
+
+# Sort order of the indexed table
+INDEX_KEYS = ["Domain", "Question", "Country", "Year"]
+
+
+def _concat_ranges(starts: np.ndarray, stops: np.ndarray) -> np.ndarray:
+    """Concatenation of arange(start, stop) for every pair, without a Python loop."""
+    lengths = stops - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return offsets + np.arange(total)
+
+
+class FilterIndex:
+    """Long table sorted by (Domain, Question, Country, Year) with per-domain lookups.
+
+    Every (Domain, Question, Country) series is a contiguous, year-sorted slice
+    of `df`, so a sidebar selection is served by gathering slices instead of
+    scanning the whole table with boolean masks.
+    """
+
+    def __init__(self, long_df: pd.DataFrame):
+        df = long_df.sort_values(INDEX_KEYS, kind="stable").reset_index(drop=True)
+        self.df = df
+        self._years = df["Year"].to_numpy()
+
+        # Per-domain sidebar options and slice bounds
+        self.options = {}
+        self._positions = {}
+        self._bounds = {}
+
+        for domain, pos in df.groupby("Domain", observed=True).indices.items():
+            lo, hi = int(pos[0]), int(pos[-1]) + 1
+            part = df.iloc[lo:hi]
+
+            q_codes = part["Question"].cat.codes.to_numpy()
+            c_codes = part["Country"].cat.codes.to_numpy()
+            uq, uc = np.unique(q_codes), np.unique(c_codes)
+            questions = [str(q) for q in df["Question"].cat.categories[uq]]
+            countries = [str(c) for c in df["Country"].cat.categories[uc]]
+
+            # Rows are sorted by (question, country), so each pair id is a run
+            pair = np.searchsorted(uq, q_codes) * len(uc) + np.searchsorted(uc, c_codes)
+            all_pairs = np.arange(len(uq) * len(uc))
+            shape = (len(uq), len(uc))
+            starts = (lo + np.searchsorted(pair, all_pairs, "left")).reshape(shape)
+            stops = (lo + np.searchsorted(pair, all_pairs, "right")).reshape(shape)
+
+            self.options[domain] = {
+                "questions": questions,
+                "countries": countries,
+                "years": [int(y) for y in np.unique(part["Year"].to_numpy())],
+            }
+            self._positions[domain] = (
+                {q: i for i, q in enumerate(questions)},
+                {c: i for i, c in enumerate(countries)},
+            )
+            self._bounds[domain] = (starts, stops)
+
+        self.domains = sorted(self.options)
+
+        # Cross-country statistics, computed once with the index
+        self.stats = StatsCube(self)
+
+    def series(self, domain: str, question: str, country: str) -> tuple:
+        """(start, stop) of one year-sorted series in `df`; (0, 0) when absent."""
+        if domain not in self._positions:
+            return 0, 0
+        q_pos, c_pos = self._positions[domain]
+        if question not in q_pos or country not in c_pos:
+            return 0, 0
+        starts, stops = self._bounds[domain]
+        qi, ci = q_pos[question], c_pos[country]
+        return int(starts[qi, ci]), int(stops[qi, ci])
+
+    def position(self, domain: str, question: str, country: str, year: int):
+        """Row of `df` holding one series point, or None."""
+        start, stop = self.series(domain, question, country)
+        k = start + int(np.searchsorted(self._years[start:stop], year))
+        if k < stop and self._years[k] == year:
+            return k
+        return None
+
+    def rows(self, domain: str, questions, countries, year_range, by: str = "Question") -> np.ndarray:
+        """Positions in `df` of the selected questions, countries and inclusive year range.
+
+        Positions are grouped by `by` ("Question" or "Country") in selection
+        order, then by the other key in selection order.
+        """
+        if domain not in self._bounds:
+            return np.empty(0, dtype=np.int64)
+
+        q_pos, c_pos = self._positions[domain]
+        qi = [q_pos[q] for q in questions if q in q_pos]
+        ci = [c_pos[c] for c in countries if c in c_pos]
+        starts, stops = self._bounds[domain]
+        starts, stops = starts[np.ix_(qi, ci)], stops[np.ix_(qi, ci)]
+        if by == "Country":
+            starts, stops = starts.T, stops.T
+        rows = _concat_ranges(starts.ravel(), stops.ravel())
+
+        years = self._years[rows]
+        return rows[(years >= year_range[0]) & (years <= year_range[1])]
+
+    def filter(self, domain: str, questions, countries, year_range, by: str = "Question") -> pd.DataFrame:
+        """Rows of `domain` for the selected questions, countries and inclusive year range.
+
+        Rows come back grouped by `by` ("Question" or "Country"), so each panel
+        of a layout is a contiguous slice of the result.
+        """
+        return self.df.iloc[self.rows(domain, questions, countries, year_range, by)]
+
+
+class StatsCube:
+    """Cross-country statistics per (Domain, Question, Year), computed once per index.
+
+    Per-row arrays are aligned with `index.df`, so a (question, year, country)
+    lookup is one series slice and a binary search over its few years.
+    """
+
+    def __init__(self, index: FilterIndex):
+        self._index = index
+        df = index.df
+        keys = [df["Domain"], df["Question"], df["Year"]]
+        values = df["value"]
+        grouped = values.groupby(keys, observed=True, sort=False)
+
+        self.mean = grouped.transform("mean").to_numpy(dtype=np.float32)
+        self.median = grouped.transform("median").to_numpy(dtype=np.float32)
+        self.count = grouped.transform("size").to_numpy(dtype=np.int32)
+        # Rank 1 is the highest value; percentile rank is the share of countries at or below
+        self.rank = grouped.rank(ascending=False, method="min").to_numpy(dtype=np.int32)
+        self.pct_rank = (grouped.rank(method="max", pct=True) * 100).to_numpy(dtype=np.float32)
+
+        # Rows are sorted by (Domain, Question, Country, Year): the previous row
+        # is the previous wave when it belongs to the same series
+        codes = [df[c].cat.codes.to_numpy() for c in ["Domain", "Question", "Country"]]
+        same = np.zeros(len(df), dtype=bool)
+        if len(df):
+            same[1:] = np.logical_and.reduce([c[1:] == c[:-1] for c in codes])
+        v = values.to_numpy(dtype=np.float32)
+        years = df["Year"].to_numpy()
+        self.change = np.where(same, v - np.roll(v, 1), np.nan).astype(np.float32)
+        self.prev_year = np.where(same, np.roll(years, 1), -1).astype(np.int16)
+
+        summary = grouped.agg(["mean", "median", "min", "max", "size"])
+        stats = zip(*(summary[c].tolist() for c in summary.columns))
+        self._summary = {
+            (str(d), str(q), int(y)): dict(zip(["mean", "median", "min", "max", "countries"], row))
+            for (d, q, y), row in zip(summary.index, stats)
+        }
+
+    @property
+    def nbytes(self) -> int:
+        arrays = [self.mean, self.median, self.count, self.rank, self.pct_rank, self.change, self.prev_year]
+        return sum(a.nbytes for a in arrays)
+
+    def summary(self, domain: str, question: str, year: int) -> dict:
+        """Mean, median, min, max and number of countries of one question and year, or None."""
+        return self._summary.get((domain, question, int(year)))
+
+    def _row(self, pos: int) -> dict:
+        df = self._index.df
+        prev_year = int(self.prev_year[pos])
+        return {
+            "Country": str(df["Country"].iat[pos]),
+            "Year": int(df["Year"].iat[pos]),
+            "value": float(df["value"].iat[pos]),
+            "mean": float(self.mean[pos]),
+            "median": float(self.median[pos]),
+            "countries": int(self.count[pos]),
+            "rank": int(self.rank[pos]),
+            "pct_rank": float(self.pct_rank[pos]),
+            "change": float(self.change[pos]),
+            "prev_year": prev_year if prev_year >= 0 else None,
+        }
+
+    def lookup(self, domain: str, question: str, country: str, year: int) -> dict:
+        """Value, cross-country stats, rank and change since the previous wave, or None."""
+        pos = self._index.position(domain, question, country, year)
+        return None if pos is None else self._row(pos)
+
+    def latest(self, domain: str, question: str, country: str, year_range=None) -> dict:
+        """Like `lookup` for the country's most recent wave (within `year_range`), or None."""
+        start, stop = self._index.series(domain, question, country)
+        if year_range is not None:
+            years = self._index._years[start:stop]
+            stop = start + int(np.searchsorted(years, year_range[1], side="right"))
+            start = start + int(np.searchsorted(years, year_range[0], side="left"))
+        return self._row(stop - 1) if stop > start else None
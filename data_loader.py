@@ -0,0 +1,382 @@
+import hashlib
+import importlib.util
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# Bump when the long table layout changes so old snapshots are ignored
+SNAPSHOT_VERSION = "3"
+
+# Parquet metadata key holding the column fingerprints of a snapshot
+FINGERPRINT_KEY = b"rtool.fingerprints"
+
+# Parquet metadata key marking a long-table dataset (e.g. written by ingest.py)
+DATASET_KEY = b"rtool.dataset"
+
+# Sheet name under which a Parquet dataset appears in the catalog
+DATASET_SHEET = "dataset"
+
+# pd.read_excel engines by preference, with the module each needs
+EXCEL_ENGINES = [("calamine", "python_calamine"), ("openpyxl", "openpyxl")]
+
+# Forces one engine (e.g. RTOOL_EXCEL_ENGINE=openpyxl)
+EXCEL_ENGINE_ENV = "RTOOL_EXCEL_ENGINE"
+
+# Workbook bytes to parse below which a process pool costs more than it saves
+PARALLEL_MIN_BYTES = 4 * 1024 ** 2
+
+
+# -------------------------------------------------
+# Excel readers
+# -------------------------------------------------
+@lru_cache(maxsize=None)
+def available_excel_engines() -> tuple:
+    return tuple(engine for engine, module in EXCEL_ENGINES if importlib.util.find_spec(module))
+
+
+def excel_engine() -> str:
+    """Engine used for workbooks: RTOOL_EXCEL_ENGINE, else the fastest one installed."""
+    forced = os.environ.get(EXCEL_ENGINE_ENV, "").strip()
+    if forced:
+        return forced
+    engines = available_excel_engines()
+    return engines[0] if engines else "openpyxl"
+
+
+def read_raw_sheet(file_input, sheet: str = "Sheet1", engine: str = None) -> pd.DataFrame:
+    """One sheet as pd.read_excel returns it, falling back to openpyxl if the engine fails."""
+    engine = engine or excel_engine()
+    if engine != "openpyxl":
+        try:
+            return pd.read_excel(file_input, sheet_name=sheet, engine=engine)
+        except Exception:
+            # openpyxl reads what the other engine cannot, or raises the real error
+            if hasattr(file_input, "seek"):
+                file_input.seek(0)
+    return pd.read_excel(file_input, sheet_name=sheet, engine="openpyxl")
+
+
+# -------------------------------------------------
+# Workbook -> long table
+# -------------------------------------------------
+def _categorical(labels, repeat: int = 1, tile: int = 1) -> pd.Categorical:
+    """Sorted categorical of `labels`, broadcast via its integer codes."""
+    codes, categories = pd.factorize(np.asarray(labels, dtype=object), sort=True)
+    codes = np.tile(np.repeat(codes, repeat), tile)
+    return pd.Categorical.from_codes(codes, categories=categories.astype(str))
+
+
+def reshape_long(raw: pd.DataFrame, value_cols=None) -> pd.DataFrame:
+    """Melts a Results-style sheet into the compact long table.
+
+    Schema: Domain, Question, Country (category), Year (int16), value (float32).
+    `value_cols` restricts the melt to some country–wave columns.
+    """
+    # Assume first two columns are Domain and Question
+    col0, col1 = raw.columns[0], raw.columns[1]
+    raw = raw.rename(columns={col0: "Domain", col1: "Question"})
+
+    # First row holds year information for each country column
+    year_row = raw.iloc[0]
+
+    # Data rows start from row index 1
+    data = raw.iloc[1:].reset_index(drop=True)
+
+    # Columns containing numeric values (one per country–wave)
+    all_cols = [c for c in data.columns if c not in ["Domain", "Question"]]
+    value_cols = all_cols if value_cols is None else [c for c in all_cols if c in set(value_cols)]
+
+    # Clean labels
+    domains = data["Domain"].astype(str).str.strip()
+    questions = data["Question"].astype(str).str.strip()
+
+    # Country and Year are parsed once per source column, then broadcast
+    # to that column's rows (melt order: column by column)
+    n_rows, n_cols = len(data), len(value_cols)
+    col_country = [str(c).split(".")[0] for c in value_cols]
+    col_year = year_row[value_cols].astype(int).to_numpy()
+
+    # Non-numeric placeholders (e.g. ".") count as missing
+    values = data[value_cols].apply(pd.to_numeric, errors="coerce")
+
+    # Long format
+    long_df = pd.DataFrame({
+        "Domain": _categorical(domains, tile=n_cols),
+        "Question": _categorical(questions, tile=n_cols),
+        "Country": _categorical(col_country, repeat=n_rows),
+        "Year": np.repeat(col_year, n_rows).astype(np.int16),
+        "value": values.to_numpy(dtype=np.float32).ravel(order="F"),
+    })
+
+    # Drop missing values
+    long_df = long_df.dropna(subset=["value"]).reset_index(drop=True)
+
+    return long_df
+
+
+def concat_long(frames) -> pd.DataFrame:
+    """Concatenates long tables, keeping the label columns categorical."""
+    frames = list(frames)
+    for col in ["Domain", "Question", "Country"]:
+        categories = sorted(set().union(*(f[col].cat.categories for f in frames)))
+        frames = [f.assign(**{col: f[col].cat.set_categories(categories)}) for f in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
+def column_fingerprints(raw: pd.DataFrame) -> dict:
+    """Content hashes of a raw sheet, used to find changed country–wave columns.
+
+    {"labels": hash of the Domain/Question columns,
+     "columns": {column: [hash of year and values, country, year]}}
+    """
+    labels = raw.iloc[1:, :2].astype(str).to_numpy()
+    values = raw.iloc[1:, 2:].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64)
+    year_row = raw.iloc[0]
+
+    columns = {}
+    for j, col in enumerate(raw.columns[2:]):
+        year = int(year_row[col])
+        digest = hashlib.sha1(values[:, j].tobytes() + str(year).encode()).hexdigest()
+        columns[str(col)] = [digest, str(col).split(".")[0], year]
+
+    return {
+        "labels": hashlib.sha1("\x1f".join(labels.ravel()).encode()).hexdigest(),
+        "columns": columns,
+    }
+
+
+def memory_footprint(df: pd.DataFrame) -> int:
+    """Deep in-memory size of a frame in bytes."""
+    return int(df.memory_usage(deep=True).sum())
+
+
+def read_long_data(file_input, sheet: str = "Sheet1") -> pd.DataFrame:
+    """Reads one sheet of a workbook (path or file-like) and returns the long table."""
+    raw = read_raw_sheet(file_input, sheet)
+    return reshape_long(raw)
+
+
+def update_long_data(raw: pd.DataFrame, old_df: pd.DataFrame, old_fingerprints: dict) -> tuple:
+    """Long table and fingerprints of `raw`, reusing the rows of unchanged columns of `old_df`.
+
+    Only added or changed country–wave columns are melted. Falls back to a full
+    reshape when the row labels changed, when most columns changed, or when the
+    old columns cannot be told apart by (Country, Year).
+    """
+    fingerprints = column_fingerprints(raw)
+    old_cols = (old_fingerprints or {}).get("columns", {})
+    new_cols = fingerprints["columns"]
+
+    stale = [c for c in old_cols if new_cols.get(c) != old_cols[c]]
+    fresh = [c for c in new_cols if old_cols.get(c) != new_cols[c]]
+    old_keys = [(country, year) for _, country, year in old_cols.values()]
+
+    if (
+        old_df is None or not old_cols
+        or fingerprints["labels"] != old_fingerprints.get("labels")
+        or len(set(old_keys)) != len(old_keys)
+        or len(stale) > len(old_cols) // 2
+    ):
+        return reshape_long(raw), fingerprints
+
+    keep = old_df
+    if stale:
+        countries = keep["Country"].astype(str).to_numpy()
+        years = keep["Year"].to_numpy()
+        mask = np.zeros(len(keep), dtype=bool)
+        for col in stale:
+            _, country, year = old_cols[col]
+            mask |= (countries == country) & (years == year)
+        keep = keep[~mask]
+
+    if not fresh:
+        return keep.reset_index(drop=True), fingerprints
+    return concat_long([keep, reshape_long(raw, fresh)]), fingerprints
+
+
+# -------------------------------------------------
+# Atomic file writes
+# -------------------------------------------------
+@contextmanager
+def atomic_write(path: str):
+    """Yields a temporary path to write to; it replaces `path` when the block succeeds.
+
+    Readers see the old file or the new one, never a partial write. The
+    temporary file is unique per process and thread and is removed on failure.
+    """
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+
+# -------------------------------------------------
+# Parquet snapshot next to the workbook
+# -------------------------------------------------
+def workbook_hash(path: str) -> str:
+    """Content hash of the workbook file."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _snapshot_prefix(path: str, sheet: str) -> str:
+    folder, name = os.path.split(os.path.abspath(path))
+    stem = os.path.splitext(name)[0]
+    return os.path.join(folder, f".{stem}.{sheet}.")
+
+
+def snapshot_path(path: str, sheet: str = "Sheet1", digest: str = None) -> str:
+    """Location of the Parquet snapshot for a given workbook content and sheet."""
+    if digest is None:
+        digest = workbook_hash(path)
+    key = hashlib.sha256(f"{digest}|{sheet}|{SNAPSHOT_VERSION}".encode()).hexdigest()[:16]
+    return f"{_snapshot_prefix(path, sheet)}{key}.parquet"
+
+
+# Per-process memo so an unchanged workbook (same mtime and size) is not re-hashed
+_digest_memo = {}
+
+
+def _cached_digest(path: str) -> str:
+    stat = os.stat(path)
+    stamp = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    digest = _digest_memo.get(stamp)
+    if digest is None:
+        digest = workbook_hash(path)
+        _digest_memo[stamp] = digest
+    return digest
+
+
+def read_snapshot(snap: str) -> pd.DataFrame:
+    """Memory-mapped read of a Parquet snapshot."""
+    import pyarrow.parquet as pq
+    return pq.read_table(snap, memory_map=True).to_pandas()
+
+
+def read_snapshot_fingerprints(snap: str) -> dict:
+    """Column fingerprints stored with a snapshot, or None."""
+    import pyarrow.parquet as pq
+    metadata = pq.read_schema(snap, memory_map=True).metadata or {}
+    raw = metadata.get(FINGERPRINT_KEY)
+    return json.loads(raw) if raw else None
+
+
+def write_snapshot(long_df: pd.DataFrame, snap: str, fingerprints: dict = None) -> None:
+    """Writes the snapshot atomically and removes stale snapshots of the same sheet."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    prefix = snap.rsplit(".", 2)[0] + "."
+    table = pa.Table.from_pandas(long_df, preserve_index=False)
+    if fingerprints is not None:
+        metadata = {**(table.schema.metadata or {}), FINGERPRINT_KEY: json.dumps(fingerprints).encode()}
+        table = table.replace_schema_metadata(metadata)
+    with atomic_write(snap) as tmp:
+        pq.write_table(table, tmp)
+
+    folder = os.path.dirname(snap)
+    for f in os.listdir(folder):
+        full = os.path.join(folder, f)
+        key = full[len(prefix):-len(".parquet")]
+        if full.startswith(prefix) and f.endswith(".parquet") and "." not in key and full != snap:
+            try:
+                os.remove(full)
+            except OSError:
+                pass
+
+
+def is_dataset(file_input) -> bool:
+    """True for paths of Parquet long-table datasets (as opposed to workbooks)."""
+    return isinstance(file_input, (str, os.PathLike)) and os.fspath(file_input).lower().endswith(".parquet")
+
+
+def load_sheet_cached(file_input, sheet: str = "Sheet1", previous=None) -> tuple:
+    """(long table, column fingerprints) of one sheet, through the Parquet snapshot.
+
+    Uploaded (file-like) inputs have no location on disk and are always parsed.
+    Snapshot failures (missing pyarrow, read-only folder, corrupt file) fall back
+    to parsing the workbook. `previous` is an earlier (long table, fingerprints)
+    of the same sheet; when given, only changed columns are melted again.
+    Parquet datasets are already long tables and are read as they are.
+    """
+    if is_dataset(file_input):
+        return read_snapshot(os.fspath(file_input)), None
+
+    if not isinstance(file_input, (str, os.PathLike)):
+        file_input.seek(0)
+        raw = read_raw_sheet(file_input, sheet)
+        return update_long_data(raw, *(previous or (None, None)))
+
+    path = os.fspath(file_input)
+    snap = snapshot_path(path, sheet, _cached_digest(path))
+    if os.path.exists(snap):
+        try:
+            return read_snapshot(snap), read_snapshot_fingerprints(snap)
+        except Exception:
+            pass
+
+    raw = read_raw_sheet(path, sheet)
+    long_df, fingerprints = update_long_data(raw, *(previous or (None, None)))
+    try:
+        write_snapshot(long_df, snap, fingerprints)
+    except Exception:
+        pass
+    return long_df, fingerprints
+
+
+def load_long_data_cached(file_input, sheet: str = "Sheet1") -> pd.DataFrame:
+    """Like read_long_data, but reuses a content-hashed Parquet snapshot for workbook paths."""
+    return load_sheet_cached(file_input, sheet)[0]
+
+
+def _load_sheet_task(task: tuple) -> tuple:
+    return load_sheet_cached(*task)
+
+
+def load_sheets_cached(tasks, max_workers: int = None) -> list:
+    """load_sheet_cached for several (file_input, sheet, previous) tasks, in task order.
+
+    Workbook paths are parsed in a process pool when several need it, they add
+    up to PARALLEL_MIN_BYTES and more than one CPU is available; snapshots and
+    uploads are read in-process.
+    """
+    tasks = [tuple(t) + (None,) * (3 - len(t)) for t in tasks]
+    results = [None] * len(tasks)
+
+    pooled = []
+    for i, (file_input, sheet, previous) in enumerate(tasks):
+        if is_dataset(file_input) or not isinstance(file_input, (str, os.PathLike)):
+            continue
+        path = os.fspath(file_input)
+        if not os.path.exists(snapshot_path(path, sheet, _cached_digest(path))):
+            pooled.append(i)
+
+    workers = min(len(pooled), max_workers or os.cpu_count() or 1)
+    if workers > 1 and sum(os.path.getsize(tasks[i][0]) for i in pooled) >= PARALLEL_MIN_BYTES:
+        # The server is multi-threaded, so workers are not forked from it
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            for i, result in zip(pooled, pool.map(_load_sheet_task, [tasks[i] for i in pooled])):
+                results[i] = result
+
+    for i, task in enumerate(tasks):
+        if results[i] is None:
+            results[i] = load_sheet_cached(*task)
+    return results
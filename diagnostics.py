@@ -0,0 +1,183 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Opt-in switches for the rerun profiler (env var or ?profile=1 query param)
+PROFILE_ENV = "RTOOL_PROFILE"
+PROFILE_LOG_ENV = "RTOOL_PROFILE_LOG"
+DEFAULT_PROFILE_LOG = "rtool_profile.jsonl"
+
+# Sessions not seen for this many seconds no longer count as active
+SESSION_IDLE_SECONDS = 600
+
+
+def resident_memory() -> int:
+    """Resident set size of this process in bytes, or None where it cannot be read."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class SessionTracker:
+    """Sessions seen by this server process, to split resident memory per session.
+
+    Created once at startup; `baseline` is the resident memory at that point
+    (interpreter, Streamlit and libraries), which no session accounts for.
+    """
+
+    def __init__(self):
+        self._seen = {}
+        self._lock = threading.Lock()
+        self.baseline = resident_memory()
+
+    def touch(self, session_id: str) -> None:
+        with self._lock:
+            self._seen[session_id] = time.monotonic()
+
+    def active(self) -> int:
+        cutoff = time.monotonic() - SESSION_IDLE_SECONDS
+        with self._lock:
+            self._seen = {k: t for k, t in self._seen.items() if t >= cutoff}
+            return len(self._seen)
+
+
+def memory_report(shared_bytes: int, sessions: int, baseline: int = None) -> dict:
+    """Process memory split into the startup baseline, shared caches and the rest.
+
+    "per_session" is the average over active sessions of what is left, i.e. of
+    memory that is neither baseline nor shared.
+    """
+    rss = resident_memory()
+    report = {"rss": rss, "baseline": baseline, "shared": shared_bytes, "sessions": sessions, "per_session": None}
+    if rss is not None and sessions:
+        report["per_session"] = max(rss - (baseline or 0) - shared_bytes, 0) / sessions
+    return report
+
+
+# -------------------------------------------------
+# Rerun profiler
+# -------------------------------------------------
+# The profiler of the script run on the current thread, if any
+_local = threading.local()
+
+
+def profiling_enabled(query_params=None) -> bool:
+    """True when RTOOL_PROFILE is set or the page was opened with ?profile=1."""
+    flags = {"1", "true", "yes", "on"}
+    if os.environ.get(PROFILE_ENV, "").strip().lower() in flags:
+        return True
+    value = (query_params or {}).get("profile", "")
+    return str(value).strip().lower() in flags
+
+
+class RerunProfiler:
+    """Stage timings of one script run.
+
+    The script marks stage ends with `checkpoint`; code that may run inside it
+    (cached builders, chart helpers) wraps work in `timed`.
+    """
+
+    def __init__(self, session_id: str = None):
+        self.session_id = session_id
+        self.started = datetime.now(timezone.utc)
+        self.records = []
+        self.end = None
+        self._start = self._last = time.perf_counter()
+
+    def add(self, stage: str, seconds: float, **info) -> None:
+        self.records.append({"stage": stage, "ms": round(seconds * 1000, 3), **info})
+
+    def checkpoint(self, stage: str) -> None:
+        now = time.perf_counter()
+        self.add(stage, now - self._last)
+        self._last = now
+
+    def total_ms(self) -> float:
+        return round((time.perf_counter() - self._start) * 1000, 3)
+
+    def summary(self) -> list:
+        """Per-stage call count and total time, slowest first."""
+        totals = {}
+        for r in self.records:
+            calls, ms = totals.get(r["stage"], (0, 0.0))
+            totals[r["stage"]] = (calls + 1, ms + r["ms"])
+        rows = [{"stage": k, "calls": c, "total_ms": round(ms, 3)} for k, (c, ms) in totals.items()]
+        return sorted(rows, key=lambda r: r["total_ms"], reverse=True)
+
+    def write_jsonl(self, path: str = None) -> None:
+        """Appends this run as one JSON line."""
+        path = path or os.environ.get(PROFILE_LOG_ENV, DEFAULT_PROFILE_LOG)
+        line = {
+            "time": self.started.isoformat(),
+            "session": self.session_id,
+            "total_ms": self.total_ms(),
+            "end": self.end,
+            "stages": self.records,
+        }
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(line) + "\n")
+
+
+def activate(profiler) -> None:
+    """Makes `profiler` (or None) the active profiler of the current thread."""
+    _local.profiler = profiler
+
+
+def current_profiler():
+    """The active profiler of the current thread, or None (to hand over to worker threads)."""
+    return getattr(_local, "profiler", None)
+
+
+def checkpoint(stage: str) -> None:
+    profiler = getattr(_local, "profiler", None)
+    if profiler is not None:
+        profiler.checkpoint(stage)
+
+
+@contextmanager
+def timed(stage: str, **info):
+    """Records the wrapped block on the active profiler; a no-op when profiling is off."""
+    profiler = getattr(_local, "profiler", None)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.add(stage, time.perf_counter() - start, **info)
+
+
+@contextmanager
+def profiled_run(profiler, log_path: str = None):
+    """Makes `profiler` (or None) active for the wrapped run and logs the run however it ends.
+
+    Runs cut short by st.stop() or a rerun are logged too; "end" holds the
+    name of the exception that ended them, or "completed".
+    """
+    activate(profiler)
+    end = "completed"
+    try:
+        yield
+    except BaseException as e:
+        end = type(e).__name__
+        raise
+    finally:
+        activate(None)
+        if profiler is not None:
+            profiler.end = end
+            profiler.write_jsonl(log_path)
+
+
+def run_profiled(stage: str, fn, log_path: str = None):
+    """Calls `fn()` on a thread without a script run (e.g. a download) and logs its time."""
+    with profiled_run(RerunProfiler(), log_path), timed(stage):
+        return fn()
@@ -0,0 +1,70 @@
+import io
+
+import pandas as pd
+
+# Rows serialized per CSV chunk / xlsx batch
+EXPORT_CHUNK_ROWS = 100_000
+
+
+def write_csv(df: pd.DataFrame, out, chunk_rows: int = EXPORT_CHUNK_ROWS) -> None:
+    """Writes UTF-8 CSV to a binary file object, one chunk of rows at a time."""
+    if df.empty:
+        out.write(df.to_csv(index=False).encode("utf-8"))
+        return
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+        out.write(chunk.to_csv(index=False, header=(start == 0)).encode("utf-8"))
+
+
+def write_parquet(df: pd.DataFrame, out) -> None:
+    """Writes a Parquet file (categoricals stay dictionary-encoded)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), out)
+
+
+def write_xlsx(df: pd.DataFrame, out, sheet_name: str = "Data", constant_memory: bool = True,
+               chunk_rows: int = EXPORT_CHUNK_ROWS) -> None:
+    """Writes an xlsx workbook with a single sheet.
+
+    In constant-memory mode xlsxwriter flushes every finished row to a temp file,
+    so rows are written strictly in order, one batch at a time.
+    """
+    if not constant_memory:
+        with pd.ExcelWriter(out, engine="xlsxwriter") as writer:
+            df.to_excel(writer, sheet_name=sheet_name, index=False)
+        return
+
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(out, {"constant_memory": True})
+    worksheet = workbook.add_worksheet(sheet_name)
+    header = workbook.add_format({"bold": True})
+    worksheet.write_row(0, 0, [str(c) for c in df.columns], header)
+
+    row = 1
+    for start in range(0, len(df), chunk_rows):
+        # Object arrays hold plain Python scalars, which xlsxwriter understands
+        for values in df.iloc[start:start + chunk_rows].to_numpy(dtype=object):
+            worksheet.write_row(row, 0, values)
+            row += 1
+    workbook.close()
+
+
+# Format -> (writer, file name, MIME type)
+EXPORT_FORMATS = {
+    "csv": (write_csv, "filtered_data.csv", "text/csv"),
+    "xlsx": (write_xlsx, "filtered_data.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "parquet": (write_parquet, "filtered_data.parquet", "application/vnd.apache.parquet"),
+}
+
+
+def export_bytes(df: pd.DataFrame, fmt: str) -> bytes:
+    """Serializes a frame in one of EXPORT_FORMATS.
+
+    The buffer is released before returning, so only the returned bytes stay in memory.
+    """
+    writer = EXPORT_FORMATS[fmt][0]
+    with io.BytesIO() as buffer:
+        writer(df, buffer)
+        return buffer.getvalue()
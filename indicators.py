@@ -0,0 +1,407 @@
+"""Derived indicators recomputed from item-level survey microdata.
+
+The Method column of the operationalisation table (info_content) is compiled
+into one plan per variable. Plans turn a block of respondents × items into one
+score per respondent with NumPy array operations, and scores are summed per
+country–wave, so data can be fed in chunks of any size:
+
+    plans, skipped = compile_plans(columns=first_chunk.columns)
+    engine = IndicatorEngine(plans)
+    for chunk in pd.read_csv("wvs.csv", chunksize=200_000):
+        engine.update(chunk)
+    long_df = engine.result()
+
+The result has the long-table schema of data_loader (Domain, Question,
+Country, Year, value). PCA indicators are the first principal component of the
+items, fitted on complete cases: per-group item sums and the pooled covariance
+are accumulated in the same single pass, and the component is applied at the end.
+"""
+import ast
+import re
+
+import numpy as np
+import pandas as pd
+
+from info_content import get_item_descriptions, get_schema_dict, resolve_item_codes
+
+# Item values below this are survey missing codes (don't know, no answer, ...)
+MISSING_BELOW = 0
+
+_FORMULA_OPS = re.compile(r"[+\-*/–—()]")
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+
+
+# -------------------------------------------------
+# Respondent-level scores
+# -------------------------------------------------
+def _row_count(x: np.ndarray) -> np.ndarray:
+    return (~np.isnan(x)).sum(axis=1)
+
+
+def _row_mean(x: np.ndarray) -> np.ndarray:
+    n = _row_count(x)
+    total = np.nansum(x, axis=1)
+    return np.divide(total, n, out=np.full(len(x), np.nan), where=n > 0)
+
+
+def _row_sum(x: np.ndarray) -> np.ndarray:
+    return np.where(_row_count(x) > 0, np.nansum(x, axis=1), np.nan)
+
+
+def _row_count_where(x: np.ndarray, hit: np.ndarray) -> np.ndarray:
+    return np.where(_row_count(x) > 0, (hit & ~np.isnan(x)).sum(axis=1), np.nan)
+
+
+class IndicatorPlan:
+    """Compiled Method of one variable.
+
+    `kind` is "score" (respondent scores from `score(arrays)`, averaged per
+    group) or "pca" (group means of the first principal component of `items`).
+    """
+
+    def __init__(self, variable: str, domain: str, method: str, items: list, kind: str,
+                 score=None, reverse: bool = False, depends_on=()):
+        self.variable = variable
+        self.domain = domain
+        self.method = method
+        self.items = items
+        self.kind = kind
+        self.score = score
+        self.reverse = reverse
+        # Plans whose respondent scores the formula of this one uses
+        self.depends_on = list(depends_on)
+
+    def __repr__(self):
+        return f"IndicatorPlan({self.variable!r}, {self.method!r}, {len(self.items)} item(s))"
+
+
+# -------------------------------------------------
+# Method compiler
+# -------------------------------------------------
+def _reversed(items: list, scales: dict):
+    missing = [c for c in items if c not in scales]
+    if missing:
+        raise ValueError(f"reversal needs the scale of {', '.join(missing)}")
+    lo_hi = np.array([scales[c][0] + scales[c][1] for c in items], dtype=np.float64)
+    return lambda x: lo_hi - x
+
+
+def _formula(expr: str, variable: str, items: list, schema, compiled: dict):
+    """Arithmetic over item codes, constants and other variables (matched by name)."""
+    refs = {}
+
+    def resolve(token):
+        if _NUMBER.fullmatch(token):
+            return token
+        if token in items:
+            refs[token] = ("item", items.index(token))
+        else:
+            refs[token] = ("var", _referenced_variable(token, variable, schema))
+        return f"_r{list(refs).index(token)}"
+
+    # Names are runs of anything that is not an operator, bracket or space
+    text = expr.replace("–", "-").replace("—", "-")
+    body = re.sub(r"[^\s+\-*/()]+", lambda m: resolve(m.group(0)), text)
+    tree = ast.parse(body, mode="eval")
+
+    unsupported = [n for n in ast.walk(tree) if not isinstance(
+        n, (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Constant, ast.Name, ast.operator, ast.unaryop, ast.Load)
+    )]
+    if unsupported:
+        raise ValueError(f"unsupported formula: {expr}")
+
+    deps = {}
+    for token, (kind, ref) in refs.items():
+        if kind == "var":
+            plan = compiled.get(ref)
+            if plan is None or plan.kind != "score":
+                raise ValueError(f"refers to {ref}, which has no respondent-level score")
+            deps[token] = plan
+
+    ops = {ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.divide}
+
+    def evaluate(node, x, arrays):
+        if isinstance(node, ast.Expression):
+            return evaluate(node.body, x, arrays)
+        if isinstance(node, ast.BinOp) and type(node.op) in ops:
+            return ops[type(node.op)](evaluate(node.left, x, arrays), evaluate(node.right, x, arrays))
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            return -evaluate(node.operand, x, arrays)
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            return float(node.value)
+        if isinstance(node, ast.Name):
+            token = list(refs)[int(node.id[2:])]
+            kind, ref = refs[token]
+            return x[:, ref] if kind == "item" else deps[token].score(arrays)
+        raise ValueError(f"unsupported formula: {expr}")
+
+    def score(arrays):
+        return evaluate(tree, arrays.get(variable), arrays)
+
+    return score, list(deps.values())
+
+
+def _referenced_variable(token: str, variable: str, schema) -> str:
+    """Variable named by a formula token: exact name, unique name containing it, or same items."""
+    if token in schema and token != variable:
+        return token
+    matches = [v for v in schema if v != variable and token.lower() in v.lower()]
+    if len(matches) == 1:
+        return matches[0]
+    # e.g. "D1_02 / 5" scales the variable built from the same items
+    items_used = schema[variable].get("Items Used")
+    same_items = [
+        v for v, info in schema.items()
+        if v != variable and info.get("Items Used") == items_used
+        and _formula_expression(info.get("Method", "").strip()) is None
+    ]
+    if len(same_items) == 1:
+        return same_items[0]
+    raise ValueError(f"cannot tell which variable '{token}' refers to")
+
+
+# Methods scored from the variable's own items (the others are formulas)
+_ITEM_METHODS = ("pca", "pca (reversed)", "mean", "raw", "additive", "count", "reverse", "reverse + mean")
+_ITEM_METHOD_PATTERNS = (re.compile(r'count\s*"([^"]+)"'), re.compile(r"binary\s*\((-?[\d.]+) only\)"))
+
+
+def _formula_expression(method: str):
+    """The expression of a formula method, or None for methods scored from items."""
+    key = method.lower()
+    if key in _ITEM_METHODS or any(p.fullmatch(key) for p in _ITEM_METHOD_PATTERNS):
+        return None
+    match = re.fullmatch(r"reverse\s*\((.+)\)", method, flags=re.IGNORECASE)
+    if match:
+        return match.group(1)
+    if _FORMULA_OPS.search(method) and re.search(r"[A-Za-z]", method):
+        return method.strip("() ")
+    return None
+
+
+def _compile(variable: str, info, items: list, scales: dict, schema, compiled: dict) -> IndicatorPlan:
+    method = info.get("Method", "").strip()
+    key = method.lower()
+    domain = info.get("Domain", "")
+
+    def plan(kind, score=None, reverse=False, depends_on=()):
+        return IndicatorPlan(variable, domain, method, items, kind, score, reverse, depends_on)
+
+    method_expr = _formula_expression(method)
+    if method_expr is None and not items:
+        raise ValueError("none of its items are in the data")
+
+    if key in ("pca", "pca (reversed)"):
+        if len(items) < 2:
+            raise ValueError("PCA needs at least two items")
+        return plan("pca", reverse="reversed" in key)
+    if key in ("mean", "raw"):
+        return plan("score", lambda a: _row_mean(a[variable]))
+    if key == "additive":
+        return plan("score", lambda a: _row_sum(a[variable]))
+    if key == "count":
+        return plan("score", lambda a: _row_count_where(a[variable], a[variable] > 0))
+    match = _ITEM_METHOD_PATTERNS[0].fullmatch(key)
+    if match:
+        value = float(match.group(1))
+        return plan("score", lambda a: _row_count_where(a[variable], a[variable] == value))
+    match = _ITEM_METHOD_PATTERNS[1].fullmatch(key)
+    if match:
+        value = float(match.group(1))
+        return plan("score", lambda a: np.where(np.isnan(a[variable][:, 0]), np.nan, a[variable][:, 0] == value))
+    if key in ("reverse", "reverse + mean"):
+        flip = _reversed(items, scales)
+        return plan("score", lambda a: _row_mean(flip(a[variable])))
+    if method_expr is None:
+        raise ValueError(f"method '{method}' cannot be computed from items")
+
+    try:
+        score, deps = _formula(method_expr, variable, items, schema, compiled)
+    except (ValueError, SyntaxError) as e:
+        raise ValueError(f"method '{method}' is not supported: {e}")
+    return plan("score", score, depends_on=deps)
+
+
+def compile_plans(variables=None, columns=None, scales=None) -> tuple:
+    """({variable: IndicatorPlan}, {variable: reason it was skipped}).
+
+    `columns` are the item columns of the microdata; ranges in "Items Used"
+    expand to the codes among them (by default, the codes described in
+    info_content). `scales` maps item codes to their (min, max) for methods
+    that reverse items without stating the scale.
+    """
+    schema = get_schema_dict()
+    scales = dict(scales or {})
+    known = set(columns) if columns is not None else set(get_item_descriptions())
+
+    # Every variable is compiled (formulas may refer to any of them), in two
+    # rounds so a formula can use a variable further down the table
+    plans, errors = {}, {}
+    for _ in range(2):
+        for variable, info in schema.items():
+            if variable in plans:
+                continue
+            items = resolve_item_codes(info.get("Items Used", ""), known)
+            try:
+                plans[variable] = _compile(variable, info, items, scales, schema, plans)
+                errors.pop(variable, None)
+            except ValueError as e:
+                errors[variable] = str(e)
+
+    wanted = list(variables) if variables is not None else list(schema)
+    skipped = {v: errors.get(v, "not in the operationalisation table") for v in wanted if v not in plans}
+    return {v: plans[v] for v in wanted if v in plans}, skipped
+
+
+# -------------------------------------------------
+# Chunked aggregation
+# -------------------------------------------------
+def _grow(arr: np.ndarray, n: int) -> np.ndarray:
+    if len(arr) >= n:
+        return arr
+    extra = np.zeros((n - len(arr),) + arr.shape[1:], dtype=arr.dtype)
+    return np.concatenate([arr, extra])
+
+
+class IndicatorEngine:
+    """Accumulates per country–wave sums of indicator scores over chunks of microdata.
+
+    Memory is bounded by the number of country–waves and items, not by the
+    number of respondents fed through `update`.
+    """
+
+    def __init__(self, plans: dict, country_col: str = "Country", year_col: str = "Year",
+                 missing_below=MISSING_BELOW):
+        self.plans = plans
+        self.country_col = country_col
+        self.year_col = year_col
+        self.missing_below = missing_below
+        # Requested plans plus those their formulas draw scores from
+        self._inputs = {}
+        stack = list(plans.values())
+        while stack:
+            plan = stack.pop()
+            if plan.variable not in self._inputs:
+                self._inputs[plan.variable] = plan
+                stack += plan.depends_on
+        self.items = sorted({c for p in self._inputs.values() for c in p.items})
+        self.groups = {}
+        self.rows = 0
+        # Score plans: per-group sum and count of respondent scores
+        self._sum = {v: np.zeros(0) for v, p in plans.items() if p.kind == "score"}
+        self._n = {v: np.zeros(0) for v in self._sum}
+        # PCA plans: per-group item sums of complete cases, pooled moments
+        self._pca = {
+            v: {"n": np.zeros(0), "sum": np.zeros((0, len(p.items))),
+                "total": 0, "s1": np.zeros(len(p.items)), "s2": np.zeros((len(p.items),) * 2)}
+            for v, p in plans.items() if p.kind == "pca"
+        }
+
+    def _group_codes(self, chunk: pd.DataFrame) -> np.ndarray:
+        """Global country–wave id of every row."""
+        keys = pd.MultiIndex.from_arrays([chunk[self.country_col], chunk[self.year_col]])
+        local, uniques = pd.factorize(keys)
+        ids = np.array([self.groups.setdefault(key, len(self.groups)) for key in uniques], dtype=np.int64)
+        return ids[local]
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        """Adds one block of respondents (one row each, item codes as columns)."""
+        valid = (chunk[self.country_col].notna() & chunk[self.year_col].notna()).to_numpy()
+        chunk = chunk[valid]
+        codes = self._group_codes(chunk)
+        n_groups = len(self.groups)
+        self.rows += len(chunk)
+
+        present = [c for c in self.items if c in chunk.columns]
+        block = chunk[present].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64, copy=True)
+        if self.missing_below is not None:
+            block[block < self.missing_below] = np.nan
+        col = {c: i for i, c in enumerate(present)}
+        nan_col = np.full(len(codes), np.nan)
+
+        arrays = {}
+        for v, plan in self._inputs.items():
+            arrays[v] = np.column_stack([block[:, col[c]] if c in col else nan_col for c in plan.items]) \
+                if plan.items else np.empty((len(codes), 0))
+
+        for v in self._sum:
+            score = np.asarray(self.plans[v].score(arrays), dtype=np.float64)
+            ok = ~np.isnan(score)
+            self._sum[v] = _grow(self._sum[v], n_groups)
+            self._n[v] = _grow(self._n[v], n_groups)
+            self._sum[v] += np.bincount(codes[ok], weights=score[ok], minlength=n_groups)
+            self._n[v] += np.bincount(codes[ok], minlength=n_groups)
+
+        for v, acc in self._pca.items():
+            x = arrays[v]
+            complete = ~np.isnan(x).any(axis=1)
+            x, g = x[complete], codes[complete]
+            acc["n"] = _grow(acc["n"], n_groups)
+            acc["sum"] = _grow(acc["sum"], n_groups)
+            acc["n"] += np.bincount(g, minlength=n_groups)
+            for j in range(x.shape[1]):
+                acc["sum"][:, j] += np.bincount(g, weights=x[:, j], minlength=n_groups)
+            acc["total"] += len(x)
+            acc["s1"] += x.sum(axis=0)
+            acc["s2"] += x.T @ x
+
+    def _pca_means(self, v: str) -> tuple:
+        acc = self._pca[v]
+        n_groups = len(self.groups)
+        group_n, group_sum = _grow(acc["n"], n_groups), _grow(acc["sum"], n_groups)
+        if acc["total"] < 2:
+            return np.full(n_groups, np.nan), group_n
+        mu = acc["s1"] / acc["total"]
+        cov = acc["s2"] / acc["total"] - np.outer(mu, mu)
+        sd = np.sqrt(np.clip(np.diag(cov), 1e-12, None))
+        eigvals, eigvecs = np.linalg.eigh(cov / np.outer(sd, sd))
+        w = eigvecs[:, -1] / np.sqrt(max(eigvals[-1], 1e-12))
+        # Component points the way most items do; "(reversed)" flips it
+        if w.sum() < 0:
+            w = -w
+        if self.plans[v].reverse:
+            w = -w
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = group_sum / group_n[:, None]
+        return ((means - mu) / sd) @ w, group_n
+
+    def result(self) -> pd.DataFrame:
+        """Long table of group means: Domain, Question, Country, Year, value."""
+        keys = list(self.groups)
+        n_groups = len(keys)
+        parts = []
+        for v, plan in self.plans.items():
+            if plan.kind == "pca":
+                value, n = self._pca_means(v)
+            else:
+                total, n = _grow(self._sum[v], n_groups), _grow(self._n[v], n_groups)
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    value = total / n
+            ok = n > 0
+            parts.append((plan, np.flatnonzero(ok), value[ok]))
+
+        countries = np.array([str(k[0]) for k in keys] + [""], dtype=object)
+        years = np.array([int(k[1]) for k in keys] + [0], dtype=np.int16)
+        sizes = [len(idx) for _, idx, _ in parts]
+        take = np.concatenate([idx for _, idx, _ in parts] + [np.zeros(0, np.int64)])
+        long_df = pd.DataFrame({
+            "Domain": pd.Categorical(np.repeat([p.domain for p, _, _ in parts], sizes).astype(object)),
+            "Question": pd.Categorical(np.repeat([p.variable for p, _, _ in parts], sizes).astype(object)),
+            "Country": pd.Categorical(countries[take]),
+            "Year": years[take],
+            "value": np.concatenate([val for _, _, val in parts] + [np.zeros(0)]).astype(np.float32),
+        })
+        return long_df.dropna(subset=["value"]).reset_index(drop=True)
+
+
+def compute_indicators(chunks, variables=None, scales=None, country_col: str = "Country",
+                       year_col: str = "Year", missing_below=MISSING_BELOW) -> tuple:
+    """(long table, {variable: reason skipped}) from an iterable of microdata frames."""
+    engine = skipped = None
+    for chunk in chunks:
+        if engine is None:
+            plans, skipped = compile_plans(variables, chunk.columns, scales)
+            engine = IndicatorEngine(plans, country_col, year_col, missing_below)
+        engine.update(chunk)
+    if engine is None:
+        raise ValueError("no microdata rows")
+    return engine.result(), skipped
@@ -1,3 +1,7 @@
+import re
+from functools import lru_cache
+from types import MappingProxyType
+
 variable_info_md = """
 # Operationalisation Table
 
@@ -146,7 +150,7 @@ variable_info_md = """
 - A173 — Freedom of choice and control (Agency)  
 """
 
-def get_schema_dict():
+def _parse_schema_dict():
     """Parses the markdown table into a dictionary keyed by Variable name."""
     lines = variable_info_md.strip().split('\n')
     
@@ -182,12 +186,11 @@ def get_schema_dict():
                 
     return schema
 
-def get_item_descriptions():
+def _parse_item_descriptions():
     """Parses the item-level descriptions into a dictionary {ItemCode: Description}."""
     lines = variable_info_md.strip().split('\n')
     
     items = {}
-    import re
     # Regex to match "- CODE — Description"
     # Handles codes like G006, E069_01
     pattern = re.compile(r'-\s+([A-Z0-9_]+)\s+[—–-]\s+(.+)')
@@ -202,4 +205,67 @@ def get_item_descriptions():
             
     return items
 
+@lru_cache(maxsize=None)
+def get_schema_dict():
+    """Read-only schema {Variable: {column: value}}, parsed once per process."""
+    return MappingProxyType({
+        var: MappingProxyType(row) for var, row in _parse_schema_dict().items()
+    })
+
+@lru_cache(maxsize=None)
+def get_item_descriptions():
+    """Read-only {ItemCode: Description}, parsed once per process."""
+    return MappingProxyType(_parse_item_descriptions())
+
+
+# Item codes such as G006, E069_01 or E069_18A
+_CODE = r"[A-Z]\d+(?:_\d+)?[A-Z]?"
+_CODE_PATTERN = re.compile(_CODE)
+# Ranges such as F115–F117 or E069_01–E069_17
+_RANGE_PATTERN = re.compile(rf"({_CODE})\s*[-–—]\s*({_CODE})")
+# Suffix lists such as A124_02,05,06,10
+_SUFFIX_LIST_PATTERN = re.compile(r"([A-Z]\d+_)\d+((?:,\s*\d+)+)")
+# Stem and numeric part of a code: F115 -> (F, 115), E069_05 -> (E069_, 5)
+_NUMBERED_PATTERN = re.compile(r"([A-Z]\d*_|[A-Z])(\d+)")
+
+
+def _split_code(code):
+    match = _NUMBERED_PATTERN.fullmatch(code)
+    if not match:
+        return code, None
+    return match.group(1), int(match.group(2))
+
+
+def resolve_item_codes(items_used: str, known_codes) -> list:
+    """Expands an "Items Used" cell into the sorted known item codes it refers to.
+
+    Handles explicit codes, ranges between codes with the same stem
+    (F115–F117, E069_01–E069_17) and suffix lists (A124_02,05,06,10).
+    """
+    known_codes = set(known_codes)
+    codes = set(_CODE_PATTERN.findall(items_used))
+
+    for stem, suffixes in _SUFFIX_LIST_PATTERN.findall(items_used):
+        codes.update(stem + s.strip() for s in suffixes.split(",") if s.strip())
+
+    for start, end in _RANGE_PATTERN.findall(items_used):
+        (s_stem, s_num), (e_stem, e_num) = _split_code(start), _split_code(end)
+        if s_num is None or e_num is None or s_stem != e_stem:
+            continue
+        for code in known_codes:
+            stem, num = _split_code(code)
+            if stem == s_stem and num is not None and s_num <= num <= e_num:
+                codes.add(code)
+
+    return sorted(codes & known_codes)
+
+
+@lru_cache(maxsize=None)
+def get_variable_items():
+    """Read-only {Variable: ((item code, description), ...)}, resolved on first use."""
+    item_descs = get_item_descriptions()
+    return MappingProxyType({
+        var: tuple((code, item_descs[code]) for code in resolve_item_codes(info.get('Items Used', ''), item_descs))
+        for var, info in get_schema_dict().items()
+    })
 
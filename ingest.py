@@ -0,0 +1,178 @@
+"""Streams item-level survey files into a long-table dataset for the app.
+
+Reads CSV or Parquet microdata in chunks (only the item and key columns),
+recomputes the indicators of the operationalisation table per country–wave
+with indicators.py, and writes the long table as Parquet:
+
+    python ingest.py wvs_1981_2022.csv --country-col S003 --year-col S020 \
+        --scale E069_18=1:4 --out WVS_derived.parquet
+
+Memory stays bounded by the chunk size and the number of country–waves, not
+by the size of the input files. A dataset written next to Results.xlsx is
+picked up by the app's catalog like another workbook. Each indicator takes
+the Domain its Question has in the workbooks (--domains-from, by default the
+workbooks in the output folder), so new waves join the existing series
+instead of appearing under the operationalisation table's domain names.
+"""
+import argparse
+import json
+import os
+import time
+
+import pandas as pd
+
+from data_loader import DATASET_KEY, atomic_write
+from indicators import MISSING_BELOW, IndicatorEngine, compile_plans
+
+# Respondents read per chunk
+INGEST_CHUNK_ROWS = 50_000
+
+
+def microdata_columns(path: str) -> list:
+    """Column names of a CSV or Parquet file, without reading its rows."""
+    if path.lower().endswith(".parquet"):
+        import pyarrow.parquet as pq
+        return list(pq.read_schema(path).names)
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def iter_microdata(path: str, columns, chunk_rows: int = INGEST_CHUNK_ROWS):
+    """Chunks of a CSV or Parquet file restricted to `columns`."""
+    columns = list(columns)
+    if path.lower().endswith(".parquet"):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+        return
+    wanted = set(columns)
+    # Items are numeric codes; anything else becomes NaN in the engine
+    yield from pd.read_csv(path, usecols=lambda c: c in wanted, chunksize=chunk_rows, low_memory=False)
+
+
+def question_domains(paths) -> dict:
+    """{Question: Domain} of the data sheets of workbooks (first workbook wins)."""
+    from catalog import DatasetCatalog
+
+    catalog = DatasetCatalog(paths)
+    domains = {}
+    for info in catalog.sheets:
+        table = catalog.load_sheet(info["source"], info["sheet"])
+        for question, domain in table[["Question", "Domain"]].drop_duplicates().itertuples(index=False):
+            domains.setdefault(str(question), str(domain))
+    return domains
+
+
+def apply_domains(long_df: pd.DataFrame, domains: dict) -> pd.DataFrame:
+    """Relabels each Question's Domain with `domains` where the Question is listed."""
+    if not domains or long_df.empty:
+        return long_df
+    questions = long_df["Question"].astype(str)
+    domain = questions.map(domains).fillna(long_df["Domain"].astype(str))
+    return long_df.assign(Domain=pd.Categorical(domain))
+
+
+def write_dataset(long_df: pd.DataFrame, out: str, info: dict = None) -> None:
+    """Writes a long table as Parquet (atomically), tagged as an RTool dataset."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.Table.from_pandas(long_df, preserve_index=False)
+    metadata = {**(table.schema.metadata or {}), DATASET_KEY: json.dumps(info or {}).encode()}
+    with atomic_write(out) as tmp:
+        pq.write_table(table.replace_schema_metadata(metadata), tmp)
+
+
+def ingest_microdata(paths, out: str, variables=None, scales=None, country_col: str = "Country",
+                     year_col: str = "Year", chunk_rows: int = INGEST_CHUNK_ROWS,
+                     missing_below=MISSING_BELOW, domains: dict = None) -> dict:
+    """Aggregates microdata files into one long-table dataset at `out`; returns a summary.
+
+    `domains` ({Question: Domain}, see question_domains) relabels the indicators'
+    domains to match existing workbooks.
+    """
+    paths = list(paths)
+    header = set()
+    for path in paths:
+        header.update(microdata_columns(path))
+    for key in (country_col, year_col):
+        if key not in header:
+            raise ValueError(f"column '{key}' not found in the microdata")
+
+    plans, skipped = compile_plans(variables, header, scales)
+    if not plans:
+        raise ValueError("none of the indicators can be computed from these columns")
+    engine = IndicatorEngine(plans, country_col, year_col, missing_below)
+
+    for path in paths:
+        present = set(microdata_columns(path))
+        columns = [c for c in [country_col, year_col] + engine.items if c in present]
+        for chunk in iter_microdata(path, columns, chunk_rows):
+            engine.update(chunk)
+
+    long_df = engine.result()
+    domains = domains or {}
+    long_df = apply_domains(long_df, domains)
+    summary = {
+        "sources": [os.path.basename(p) for p in paths],
+        "respondents": engine.rows,
+        "groups": len(engine.groups),
+        "indicators": sorted(plans),
+        "skipped": skipped,
+        "unmatched_domains": sorted(v for v in plans if v not in domains),
+    }
+    write_dataset(long_df, out, summary)
+    return summary
+
+
+def parse_scales(values) -> dict:
+    """CODE=LO:HI entries -> {CODE: (LO, HI)}."""
+    scales = {}
+    for value in values or []:
+        code, _, bounds = value.partition("=")
+        lo, _, hi = bounds.partition(":")
+        scales[code.strip()] = (float(lo), float(hi))
+    return scales
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="+", help="CSV or Parquet microdata files")
+    parser.add_argument("--out", required=True, help="Output Parquet dataset")
+    parser.add_argument("--country-col", default="Country")
+    parser.add_argument("--year-col", default="Year")
+    parser.add_argument("--variables", nargs="*", help="Indicators to compute (default: all computable)")
+    parser.add_argument("--scale", action="append", dest="scales", metavar="CODE=LO:HI",
+                        help="Scale of an item reversed without an explicit formula (repeatable)")
+    parser.add_argument("--chunk-rows", type=int, default=INGEST_CHUNK_ROWS)
+    parser.add_argument("--missing-below", type=float, default=MISSING_BELOW,
+                        help="Item values below this are treated as missing")
+    parser.add_argument("--domains-from", nargs="*",
+                        help="Workbooks whose Question -> Domain labels the dataset uses "
+                             "(default: the .xlsx workbooks in the output folder)")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    workbooks = args.domains_from
+    if workbooks is None:
+        from catalog import find_workbooks
+        workbooks = [p for p in find_workbooks(os.path.dirname(os.path.abspath(args.out))) if p.lower().endswith(".xlsx")]
+    try:
+        summary = ingest_microdata(
+            args.paths, args.out, args.variables, parse_scales(args.scales),
+            args.country_col, args.year_col, args.chunk_rows, args.missing_below,
+            question_domains(workbooks) if workbooks else None
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+    for variable, reason in summary["skipped"].items():
+        print(f"skipped {variable}: {reason}")
+    if summary["unmatched_domains"]:
+        print(f"not in the workbooks, domain from the operationalisation table: "
+              f"{', '.join(summary['unmatched_domains'])}")
+    print(f"Wrote {len(summary['indicators'])} indicator(s) for {summary['groups']} country–wave(s) "
+          f"from {summary['respondents']:,} respondents to {args.out} in {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import logging
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import CancelledError, ThreadPoolExecutor, as_completed
+
+from chart_cache import asset_key, load_spec, prune, store_spec, store_static
+from charts import COUNTRY_PANELS, MAX_CHART_POINTS, SINGLE_FIGURE, chart_to_spec, plan_panel_charts
+from data_loader import memory_footprint
+from diagnostics import activate, current_profiler, timed
+
+# Threads building panel specs, shared by every session of the server
+RENDER_WORKERS = 4
+
+# Sidebar defaults, i.e. the view most sessions open first
+DEFAULT_CHART_TYPE = "Line Chart"
+DEFAULT_GRAPH_STYLE = "Colorblind-safe (default)"
+DEFAULT_THEME = "Academic (light)"
+
+# Set to 0 to skip warming the chart cache when data is (re)loaded
+CHART_WARM_UP_ENV = "RTOOL_CHART_WARM_UP"
+
+# Seconds the warm-up yields between panels, leaving the GIL to sessions
+WARM_UP_PAUSE = 0.05
+
+_executor = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix="rtool-render")
+
+# Warm-ups run one at a time on their own thread, never on the render workers
+_warm_up_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rtool-warm-up")
+
+# Views alive in this process (e.g. in the app's view cache), for memory reports
+_views = weakref.WeakSet()
+
+logger = logging.getLogger(__name__)
+
+
+class PanelView:
+    """Panels of one view whose Vega-Lite specs are built on worker threads, once.
+
+    `planned` is the output of charts.plan_panel_charts. Frames are available
+    right away; `specs()` yields each panel's spec as soon as it is ready.
+    Views are shared between reruns and sessions: a spec built for one
+    session is reused by the next one that shows the same view.
+
+    With a `view_key` (JSON-able view parameters), specs are also read from
+    the on-disk chart cache; with `store`, built specs are written to it.
+    """
+
+    def __init__(self, plot_df, planned: list, view_key=None, store: bool = False):
+        self.plot_df = plot_df
+        self.view_key = view_key
+        self.store = store
+        self.frames = [frame for frame, _ in planned]
+        self._builds = [build for _, build in planned]
+        self._futures = [None] * len(planned)
+        self._keys = [None] * len(planned)
+        self._lock = threading.Lock()
+        _views.add(self)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def asset_key(self, i: int) -> str:
+        """Chart cache key of panel i (needs a view_key)."""
+        if self._keys[i] is None:
+            self._keys[i] = asset_key(self.view_key, i, self.frames[i])
+        return self._keys[i]
+
+    def _build_spec(self, i: int, profiler) -> dict:
+        # Chart helpers report to the profiler of the script run that asked
+        activate(profiler)
+        try:
+            if self.view_key is None:
+                return chart_to_spec(self._builds[i]())
+            with timed("load_cached_spec"):
+                spec = load_spec(self.asset_key(i))
+            if spec is None:
+                spec = chart_to_spec(self._builds[i]())
+                if self.store:
+                    store_spec(self.asset_key(i), spec)
+            return spec
+        finally:
+            activate(None)
+
+    def spec(self, i: int) -> dict:
+        """Spec of panel i, built on the calling thread."""
+        return self._build_spec(i, current_profiler())
+
+    def _submit(self, i: int):
+        """The future of panel i's spec, (re)submitting it if it was never run or cancelled."""
+        with self._lock:
+            future = self._futures[i]
+            if future is None or future.cancelled():
+                future = _executor.submit(self._build_spec, i, current_profiler())
+                self._futures[i] = future
+            return future
+
+    def specs(self, panels=None):
+        """Yields (panel number, spec) for `panels` (default: all) in order of completion.
+
+        Closing the generator early (e.g. when Streamlit stops the script for a
+        rerun) cancels the panels not started yet; the others finish and stay
+        cached for the next run.
+        """
+        panels = range(len(self)) if panels is None else panels
+        pending = {self._submit(i): i for i in panels}
+        try:
+            while pending:
+                for future in as_completed(list(pending)):
+                    i = pending.pop(future)
+                    try:
+                        spec = future.result()
+                    except CancelledError:
+                        # Cancelled by another session's rerun; build it for this one
+                        pending[self._submit(i)] = i
+                        continue
+                    yield i, spec
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def views_footprint() -> int:
+    """Bytes held by the frames of live views (collapsed panel frames are copies; slices are not)."""
+    total = 0
+    for view in list(_views):
+        total += memory_footprint(view.plot_df)
+        total += sum(memory_footprint(f) for f in view.frames if "low" in f.columns)
+    return total
+
+
+def make_view(index, domain: str, questions, countries, year_range, chart_type: str, layout: str,
+              graph_style: str, theme: str, focal_country=None, facet_columns=None,
+              max_points=MAX_CHART_POINTS, store: bool = False) -> PanelView:
+    """Filtered frame and planned panels of one selection, backed by the chart cache.
+
+    Charts above `max_points` draw their top series and average the rest.
+    With `store`, built specs are written to the chart cache.
+    """
+    # Grouped by panel key, so every panel frame is a slice of plot_df, not a copy
+    by = "Country" if layout == COUNTRY_PANELS else "Question"
+    with timed("filter_plot_df"):
+        plot_df = index.filter(domain, questions, countries, year_range, by)
+    if plot_df.empty:
+        return PanelView(plot_df, [])
+    planned = plan_panel_charts(
+        plot_df, domain, questions, countries, chart_type, layout, graph_style, theme,
+        focal_country, facet_columns, max_points
+    )
+    view_key = [
+        domain, list(questions), list(countries), [int(y) for y in year_range], chart_type, layout,
+        graph_style, theme, focal_country, facet_columns, max_points,
+    ]
+    return PanelView(plot_df, planned, view_key, store)
+
+
+def default_view(index, domain: str) -> PanelView:
+    """The view a new session opens for `domain`: first question, every country, all years."""
+    options = index.options[domain]
+    years = options["years"]
+    return make_view(
+        index, domain, options["questions"][:1], options["countries"], (min(years), max(years)),
+        DEFAULT_CHART_TYPE, SINGLE_FIGURE, DEFAULT_GRAPH_STYLE, DEFAULT_THEME, store=True
+    )
+
+
+def warm_up(catalog, formats=(), domains=None, pause: float = 0.0) -> int:
+    """Renders the default view of `domains` into the chart cache; returns the number of panels.
+
+    By default only the first domain is warmed, the one a new session opens;
+    other domains stay unloaded until a session selects them. Panels are built one by one on the calling thread, `pause` seconds apart.
+    `formats` ("svg", "png") also stores static renderings.
+    """
+    panels = 0
+    for domain in catalog.domains[:1] if domains is None else domains:
+        index = catalog.domain_index(domain)
+        options = index.options.get(domain)
+        if not options or not options["questions"] or not options["years"]:
+            continue
+        view = default_view(index, domain)
+        for i in range(len(view)):
+            spec = view.spec(i)
+            if formats:
+                store_static(view.asset_key(i), spec, view.frames[i], formats)
+            panels += 1
+            time.sleep(pause)
+    prune()
+    return panels
+
+
+def _warm_up_quietly(catalog) -> int:
+    try:
+        return warm_up(catalog, pause=WARM_UP_PAUSE)
+    except Exception:
+        # A cold cache only costs speed; sessions build what they need
+        logger.exception("Chart warm-up failed")
+        return 0
+
+
+def warm_up_in_background(catalog):
+    """Queues `warm_up` on the warm-up thread (unless RTOOL_CHART_WARM_UP=0); returns its Future or None."""
+    if os.environ.get(CHART_WARM_UP_ENV, "1").strip() == "0":
+        return None
+    return _warm_up_executor.submit(_warm_up_quietly, catalog)
@@ -0,0 +1,60 @@
+"""Background reloads of changed workbooks.
+
+Run from the repository root with `pytest`.
+"""
+import os
+import time
+
+import pytest
+
+from benchmarks.synthetic import make_raw_sheet, write_workbook
+from catalog import DatasetCatalog
+
+
+def wait_for_reload(catalog: DatasetCatalog, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while catalog.reloading:
+        assert time.monotonic() < deadline, "reload did not finish"
+        time.sleep(0.02)
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    path = str(tmp_path / "Results.xlsx")
+    write_workbook(path, make_raw_sheet(n_countries=3, n_waves=2, n_questions=6, n_domains=2))
+    return path
+
+
+def test_broken_workbook_is_not_retried_until_it_changes(workbook, caplog):
+    catalog = DatasetCatalog([workbook])
+    rows = len(catalog.domain_index("Domain 0").df)
+
+    # Saved half-way: not a valid workbook
+    with open(workbook, "wb") as f:
+        f.write(b"PK\x03\x04 not a workbook")
+    assert catalog.refresh(min_interval=0)
+    wait_for_reload(catalog)
+
+    assert catalog.version == 0
+    assert len(catalog.domain_index("Domain 0").df) == rows
+    assert len([r for r in caplog.records if "Reloading" in r.getMessage()]) == 1
+    assert not catalog.refresh(min_interval=0)
+
+    # Saved again in full: reloaded
+    write_workbook(workbook, make_raw_sheet(n_countries=4, n_waves=2, n_questions=6, n_domains=2))
+    assert catalog.refresh(min_interval=0)
+    wait_for_reload(catalog)
+    assert catalog.version == 1
+    assert len(catalog.domain_index("Domain 0").df) > rows
+
+
+def test_deleted_workbook_keeps_the_loaded_data(workbook):
+    catalog = DatasetCatalog([workbook])
+    index = catalog.domain_index("Domain 1")
+
+    os.remove(workbook)
+    assert catalog.refresh(min_interval=0)
+    wait_for_reload(catalog)
+
+    assert catalog.domain_index("Domain 1") is index
+    assert not catalog.refresh(min_interval=0)
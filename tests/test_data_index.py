@@ -0,0 +1,138 @@
+"""FilterIndex lookups and StatsCube.latest against plain pandas filtering.
+
+Run from the repository root with `pytest`.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import make_raw_sheet
+from data_index import FilterIndex
+from data_loader import reshape_long
+
+
+@pytest.fixture(scope="module")
+def long_df():
+    return reshape_long(make_raw_sheet(n_countries=8, n_waves=4, n_questions=21, n_domains=3, missing=0.2))
+
+
+@pytest.fixture(scope="module")
+def index(long_df):
+    return FilterIndex(long_df)
+
+
+def selection(index, domain="Domain 1"):
+    options = index.options[domain]
+    # Out of sorted order, with a name that is not in the domain
+    questions = options["questions"][::-2] + ["Missing question"]
+    countries = options["countries"][1::2][::-1] + ["Nowhere"]
+    return domain, questions, countries
+
+
+def masked(long_df, domain, questions, countries, year_range):
+    """The selection by boolean masks over the unsorted table."""
+    df = long_df.astype({c: str for c in ["Domain", "Question", "Country"]})
+    return df[
+        (df["Domain"] == domain) & df["Question"].isin(questions) & df["Country"].isin(countries)
+        & df["Year"].between(*year_range)
+    ]
+
+
+# -------------------------------------------------
+# FilterIndex
+# -------------------------------------------------
+def test_options(index, long_df):
+    part = long_df[long_df["Domain"] == "Domain 2"]
+    options = index.options["Domain 2"]
+    assert options["questions"] == sorted(part["Question"].astype(str).unique())
+    assert options["countries"] == sorted(part["Country"].astype(str).unique())
+    assert options["years"] == sorted(int(y) for y in part["Year"].unique())
+    assert index.domains == ["Domain 0", "Domain 1", "Domain 2"]
+
+
+@pytest.mark.parametrize("year_range", [(0, 9999), (1985, 1993), (1993, 1993), (2100, 2200)])
+@pytest.mark.parametrize("by", ["Question", "Country"])
+def test_filter_matches_masks(index, long_df, year_range, by):
+    domain, questions, countries = selection(index)
+    got = index.filter(domain, questions, countries, year_range, by)
+    expected = masked(long_df, domain, questions, countries, year_range)
+    assert len(got) == len(expected)
+
+    # Grouped by `by` in selection order, then by the other key in selection order, then by year
+    order = {"Question": questions, "Country": countries}
+    other = "Country" if by == "Question" else "Question"
+    keys = list(zip(
+        got[by].astype(str).map(order[by].index), got[other].astype(str).map(order[other].index), got["Year"]
+    ))
+    assert keys == sorted(keys)
+
+    plain = got.astype({c: str for c in ["Domain", "Question", "Country"]})
+    key = ["Question", "Country", "Year"]
+    pd.testing.assert_frame_equal(
+        plain.sort_values(key).reset_index(drop=True),
+        expected.sort_values(key).reset_index(drop=True),
+    )
+
+
+def test_rows_are_positions_in_df(index):
+    domain, questions, countries = selection(index)
+    rows = index.rows(domain, questions, countries, (0, 9999))
+    pd.testing.assert_frame_equal(index.df.iloc[rows], index.filter(domain, questions, countries, (0, 9999)))
+
+
+def test_empty_selections(index):
+    assert len(index.rows("No domain", ["Q0000"], ["Country000"], (0, 9999))) == 0
+    assert index.filter("Domain 1", [], index.options["Domain 1"]["countries"], (0, 9999)).empty
+    assert index.filter("Domain 1", index.options["Domain 1"]["questions"], ["Nowhere"], (0, 9999)).empty
+
+
+# -------------------------------------------------
+# StatsCube.latest
+# -------------------------------------------------
+def expected_latest(long_df, domain, question, country, year_range):
+    df = long_df.astype({c: str for c in ["Domain", "Question", "Country"]})
+    same_question = df[(df["Domain"] == domain) & (df["Question"] == question)]
+    series = same_question[same_question["Country"] == country].sort_values("Year")
+    in_range = series[series["Year"].between(*year_range)]
+    if in_range.empty:
+        return None
+    row = in_range.iloc[-1]
+    wave = same_question[same_question["Year"] == row["Year"]]["value"]
+    earlier = series[series["Year"] < row["Year"]]
+    return {
+        "Year": int(row["Year"]),
+        "value": float(row["value"]),
+        "mean": float(np.float32(wave.mean())),
+        "median": float(np.float32(wave.median())),
+        "countries": len(wave),
+        "rank": int((wave > row["value"]).sum()) + 1,
+        "pct_rank": float(np.float32((wave <= row["value"]).mean() * 100)),
+        "prev_year": int(earlier["Year"].iloc[-1]) if len(earlier) else None,
+        "change": float(np.float32(row["value"] - earlier["value"].iloc[-1])) if len(earlier) else None,
+    }
+
+
+@pytest.mark.parametrize("year_range", [(0, 9999), (1981, 1990), (1990, 1994), (2100, 2200)])
+def test_latest_matches_pandas(index, long_df, year_range):
+    for domain in index.domains:
+        options = index.options[domain]
+        for question in options["questions"][:3]:
+            for country in options["countries"]:
+                got = index.stats.latest(domain, question, country, year_range)
+                expected = expected_latest(long_df, domain, question, country, year_range)
+                if expected is None:
+                    assert got is None
+                    continue
+                assert got["Country"] == country
+                change = expected.pop("change")
+                for key, value in expected.items():
+                    assert got[key] == pytest.approx(value, rel=1e-5), key
+                if change is None:
+                    assert np.isnan(got["change"])
+                else:
+                    assert got["change"] == pytest.approx(change, rel=1e-5, abs=1e-6)
+
+
+def test_latest_of_missing_series(index):
+    assert index.stats.latest("Domain 1", "Missing question", "Country000") is None
+    assert index.stats.latest("No domain", "Q0000", "Country000") is None
@@ -0,0 +1,138 @@
+"""Incremental sheet updates must give the same long table as a full reshape.
+
+Run from the repository root with `pytest`.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_loader
+from benchmarks.synthetic import make_raw_sheet
+from data_loader import column_fingerprints, reshape_long, update_long_data
+
+LABELS = ["Domain", "Question", "Country"]
+
+
+@pytest.fixture
+def raw():
+    return make_raw_sheet(n_countries=12, n_waves=3, n_questions=30)
+
+
+@pytest.fixture
+def melts(monkeypatch):
+    """The `value_cols` of every reshape_long call (None for a full reshape)."""
+    calls = []
+
+    def recording(raw, value_cols=None):
+        calls.append(None if value_cols is None else list(value_cols))
+        return reshape_long(raw, value_cols)
+
+    monkeypatch.setattr(data_loader, "reshape_long", recording)
+    return calls
+
+
+def assert_same_rows(incremental: pd.DataFrame, full: pd.DataFrame) -> None:
+    """Same rows and dtypes in any order; label columns stay categorical."""
+    for df in (incremental, full):
+        assert all(isinstance(df[c].dtype, pd.CategoricalDtype) for c in LABELS)
+
+    def plain(df):
+        df = df.astype({c: str for c in LABELS})
+        return df.sort_values(LABELS + ["Year"]).reset_index(drop=True)[list(full.columns)]
+
+    pd.testing.assert_frame_equal(plain(incremental), plain(full), check_exact=True)
+
+
+def update(raw: pd.DataFrame, edited: pd.DataFrame) -> pd.DataFrame:
+    new_df, fingerprints = update_long_data(edited, reshape_long(raw), column_fingerprints(raw))
+    assert fingerprints == column_fingerprints(edited)
+    assert_same_rows(new_df, reshape_long(edited))
+    return new_df
+
+
+# -------------------------------------------------
+# Incremental path
+# -------------------------------------------------
+def test_unchanged_sheet_melts_nothing(raw, melts):
+    update(raw, raw.copy())
+    assert melts == []
+
+
+def test_changed_values_melt_only_those_columns(raw, melts):
+    cols = list(raw.columns[2:])
+    edited = raw.copy()
+    edited.loc[1:, cols[:2]] += 1.0
+    edited.loc[3, cols[2]] = np.nan
+    update(raw, edited)
+    assert melts == [cols[:3]]
+
+
+def test_changed_year_moves_the_column(raw, melts):
+    col = raw.columns[5]
+    edited = raw.copy()
+    edited.loc[0, col] += 1
+    new_df = update(raw, edited)
+    assert melts == [[col]]
+    country, year = col.split(".")[0], int(raw.loc[0, col])
+    assert not ((new_df["Country"] == country) & (new_df["Year"] == year)).any()
+
+
+def test_added_columns(raw, melts):
+    edited = raw.copy()
+    n_rows = len(raw) - 1
+    edited["CountryNew"] = [2030] + list(np.linspace(0, 1, n_rows))
+    edited["CountryNew.1"] = [2034] + [np.nan] * n_rows
+    new_df = update(raw, edited)
+    assert melts == [["CountryNew", "CountryNew.1"]]
+    assert (new_df["Country"] == "CountryNew").sum() == n_rows
+
+
+def test_removed_columns(raw, melts):
+    edited = raw.drop(columns=raw.columns[-2:])
+    update(raw, edited)
+    assert melts == []
+
+
+def test_changed_added_and_removed_columns(raw, melts):
+    cols = list(raw.columns[2:])
+    edited = raw.drop(columns=cols[-1:])
+    edited.loc[1:, cols[0]] *= 2
+    edited["CountryNew"] = [2030] + [0.5] * (len(raw) - 1)
+    update(raw, edited)
+    assert melts == [[cols[0], "CountryNew"]]
+
+
+# -------------------------------------------------
+# Fallbacks to a full reshape
+# -------------------------------------------------
+def test_changed_label_row_reshapes_everything(raw, melts):
+    edited = raw.copy()
+    edited.iloc[5, 1] = " Renamed question"
+    new_df = update(raw, edited)
+    assert melts == [None]
+    assert "Renamed question" in set(new_df["Question"].astype(str))
+
+
+def test_most_columns_changed_reshapes_everything(raw, melts):
+    edited = raw.copy()
+    edited.loc[1:, raw.columns[2:]] += 1.0
+    update(raw, edited)
+    assert melts == [None]
+
+
+def test_ambiguous_old_columns_reshape_everything(raw, melts):
+    # Two waves of one country in the same year cannot be told apart by (Country, Year)
+    cols = list(raw.columns[2:])
+    ambiguous = raw.copy()
+    ambiguous.loc[0, cols[1]] = ambiguous.loc[0, cols[0]]
+    edited = ambiguous.copy()
+    edited.loc[1:, cols[0]] += 1.0
+    update(ambiguous, edited)
+    assert melts == [None]
+
+
+def test_no_previous_table_reshapes_everything(raw, melts):
+    new_df, fingerprints = update_long_data(raw, None, None)
+    assert melts == [None]
+    assert fingerprints == column_fingerprints(raw)
+    assert_same_rows(new_df, reshape_long(raw))